@@ -36,6 +36,14 @@ class ABLexer(object):
     def token(self,):
         return self.lexer.token()
 
+    # terminal ids (indexes into tokens) of every token in data as an array('i'), for the parsers
+    # pre-tokenized input path. data is lexed in full, the parsers lex str and buffer input one
+    # token at a time instead
+    def tokenize_to_array(self, data):
+        token_ids = {token: token_id for token_id, token in enumerate(self.tokens)}
+        self.lexer.input(data)
+        return self.lexer.tokenize_all(token_ids, types_only=True)
+
 if __name__ == "__main__":
     # Build the lexer and try it out
     l = ABLexer()
@@ -0,0 +1,160 @@
+from compiled_gfg import START, END, CALL, EXIT, SCAN, NULLABLE
+
+# yields the index of every set bit in bits, lowest first
+def iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+# a sigma set stored as one bitset of node labels per tag, bit n of tags[k] is set when
+# <n, k> is in the sigma set. membership and insertion are int operations instead of hashing
+# (label, tag) tuples
+class BitsetSigmaSet:
+    def __init__(self):
+        self.tags = {}
+
+    def add(self, label, tag):
+        self.tags[tag] = self.tags.get(tag, 0) | (1 << label)
+
+    # ors bits into the set for tag, returns the bits that were not already present
+    def add_bits(self, tag, bits):
+        old = self.tags.get(tag, 0)
+        new = bits & ~old
+        if new:
+            self.tags[tag] = old | new
+        return new
+
+    def __contains__(self, element):
+        label, tag = element
+        return (self.tags.get(tag, 0) >> label) & 1 == 1
+
+    def __iter__(self):
+        for tag, bits in self.tags.items():
+            for label in iter_bits(bits):
+                yield (label, tag)
+
+    def __len__(self):
+        return sum(bin(bits).count("1") for bits in self.tags.values())
+
+# bitmasks over node labels derived from a compiled gfg
+class BitsetTables:
+    def __init__(self, compiled):
+        self.compiled = compiled
+        num_nodes = compiled.num_nodes
+        kind = compiled.kind
+
+        self.call_mask = 0
+        self.end_mask = 0
+        self.start_mask = 0
+        self.exit_mask = 0
+        # entry nodes reachable from each start node
+        self.start_entries = {}
+        # scan nodes that advance on each terminal id
+        self.scan_masks = [0] * len(compiled.terminals)
+        # build_gfg places the node after a scan node at the next label, when this holds the
+        # scan rule for a whole tag is a single mask and shift
+        self.scan_is_shift = True
+
+        for label in range(num_nodes):
+            flags = kind[label]
+            bit = 1 << label
+            if flags & CALL:
+                self.call_mask |= bit
+            if flags & END:
+                self.end_mask |= bit
+            if flags & EXIT:
+                self.exit_mask |= bit
+            if flags & START:
+                self.start_mask |= bit
+                entries = 0
+                for edge in range(compiled.edge_offsets[label], compiled.edge_offsets[label + 1]):
+                    entries |= 1 << compiled.edge_targets[edge]
+                self.start_entries[label] = entries
+            if flags & SCAN and compiled.scan_target[label] != label + 1:
+                self.scan_is_shift = False
+
+        for term in range(len(compiled.terminals)):
+            for label in compiled.scan_nodes(term):
+                self.scan_masks[term] |= 1 << label
+
+        # nodes handled by following their epsilon edges with the same tag
+        self.same_tag_mask = self.start_mask | self.exit_mask
+
+# implements the call, start, exit and end inference rules on the last bitset sigma set
+# sigma_end_to_call[k] maps an end label to {call tag: return label bits} for the calls made in
+# sigma set k, so completing a production ors all of its return nodes in at once
+def bitset_eclosuer(tables, sigma_sets, sigma_end_to_call):
+    compiled = tables.compiled
+    kind = compiled.kind
+    call_target = compiled.call_target
+    call_to_return = compiled.call_to_return
+    start_to_end = compiled.start_to_end
+    exit_to_end = compiled.exit_to_end
+    start_entries = tables.start_entries
+
+    sigma_num = len(sigma_sets) - 1
+    curr_sigma_set = sigma_sets[sigma_num]
+    curr_end_to_call = sigma_end_to_call[sigma_num]
+
+    # bits per tag that have been added but not yet expanded
+    pending = dict(curr_sigma_set.tags)
+
+    while pending:
+        tag, new = pending.popitem()
+
+        # start and exit rules, follow empty string edges keeping the tag
+        reached = 0
+        for label in iter_bits(new & tables.same_tag_mask):
+            if label in start_entries:
+                reached |= start_entries[label]
+            else:
+                reached |= 1 << exit_to_end[label]
+
+        # call rule, start nodes get the current sigma number as their tag
+        started = 0
+        for label in iter_bits(new & tables.call_mask):
+            start_label = call_target[label]
+            end_label = start_to_end[start_label]
+            return_bit = 1 << call_to_return[label]
+
+            returns_by_tag = curr_end_to_call.setdefault(end_label, {})
+            returns_by_tag[tag] = returns_by_tag.get(tag, 0) | return_bit
+            started |= 1 << start_label
+
+            # called production can derive the empty string, step over the call right away
+            if kind[start_label] & NULLABLE:
+                reached |= return_bit
+
+        # end rule, return to every caller waiting in the tag sigma set
+        for label in iter_bits(new & tables.end_mask):
+            for call_tag, return_bits in sigma_end_to_call[tag].get(label, {}).items():
+                added = curr_sigma_set.add_bits(call_tag, return_bits)
+                if added:
+                    pending[call_tag] = pending.get(call_tag, 0) | added
+
+        for add_tag, bits in ((tag, reached), (sigma_num, started)):
+            added = curr_sigma_set.add_bits(add_tag, bits)
+            if added:
+                pending[add_tag] = pending.get(add_tag, 0) | added
+
+# implements the scan inference rule from a bitset sigma set into a new one
+def bitset_scan(tables, sigma_set, term):
+    next_set = BitsetSigmaSet()
+    if term < 0:
+        return next_set
+
+    scan_mask = tables.scan_masks[term]
+    scan_target = tables.compiled.scan_target
+    for tag, bits in sigma_set.tags.items():
+        scanned = bits & scan_mask
+        if not scanned:
+            continue
+        if tables.scan_is_shift:
+            next_set.tags[tag] = scanned << 1
+        else:
+            dest_bits = 0
+            for label in iter_bits(scanned):
+                dest_bits |= 1 << scan_target[label]
+            next_set.tags[tag] = dest_bits
+    return next_set
@@ -0,0 +1,184 @@
+from array import array
+
+# node kind bitflags for the compiled grammar flow graph, a node may have several set
+# (Ex: A→a•B can be both a RETURN and a CALL node)
+START = 1
+END = 2
+CALL = 4
+RETURN = 8
+ENTRY = 16
+EXIT = 32
+SCAN = 64
+SENTINAL = 128 # remainder of the production is in sentinal form
+NULLABLE = 256 # start or end node of a production that can derive the empty string
+
+# terminal id used for empty string edges
+EPSILON = -1
+
+# frozen form of a GFG, every node label indexes directly into flat integer arrays so the
+# parsers never touch Node objects or per node edge dicts in their inner loops
+class CompiledGFG:
+    def __init__(self, num_nodes, terminals):
+        self.num_nodes = num_nodes
+
+        # terminal name <-> terminal id
+        self.terminals = list(terminals)
+        self.terminal_ids = {term: term_id for term_id, term in enumerate(self.terminals)}
+
+        # bitwise or of the node kind flags above
+        self.kind = array('i', [0]) * num_nodes
+
+        # outgoing edges in CSR form, the edges of node n are
+        # edge_targets[edge_offsets[n]:edge_offsets[n + 1]], edge_terms holds the terminal id
+        # consumed along each edge (EPSILON for empty string edges)
+        self.edge_offsets = array('i', [0]) * (num_nodes + 1)
+        self.edge_targets = array('i')
+        self.edge_terms = array('i')
+
+        # terminal consumed by a scan node and the node the scan edge goes to, -1 otherwise
+        self.scan_term = array('i', [-1]) * num_nodes
+        self.scan_target = array('i', [-1]) * num_nodes
+
+        # scan nodes that advance on each terminal in CSR form, the scan nodes for terminal t are
+        # term_scan_nodes[term_scan_offsets[t]:term_scan_offsets[t + 1]], their destinations are
+        # in scan_target
+        self.term_scan_offsets = array('i', [0]) * (len(self.terminals) + 1)
+        self.term_scan_nodes = array('i')
+
+        # start node entered by a call node, -1 otherwise
+        self.call_target = array('i', [-1]) * num_nodes
+
+        # end node an exit node leads to, -1 otherwise
+        self.exit_to_end = array('i', [-1]) * num_nodes
+
+        # single predecessor of a production node and the terminal on that edge
+        # (start node for entries, end node of the called production for returns,
+        # previous scan node otherwise)
+        self.pred = array('i', [-1]) * num_nodes
+        self.pred_term = array('i', [EPSILON]) * num_nodes
+
+        self.call_to_return = array('i', [-1]) * num_nodes
+        self.return_to_call = array('i', [-1]) * num_nodes
+        self.start_to_end = array('i', [-1]) * num_nodes
+        self.end_to_start = array('i', [-1]) * num_nodes
+
+    def terminal_id(self, term):
+        return self.terminal_ids.get(term, EPSILON)
+
+    def scan_nodes(self, term_id):
+        return self.term_scan_nodes[self.term_scan_offsets[term_id]:self.term_scan_offsets[term_id + 1]]
+
+def compile_gfg(gfg):
+    num_nodes = len(gfg.nodes)
+    compiled = CompiledGFG(num_nodes, gfg.lexer.tokens)
+    terminal_ids = compiled.terminal_ids
+
+    def term_id(edge_label):
+        return EPSILON if edge_label == "" else terminal_ids[edge_label]
+
+    # node labels are assigned densely from 0 by build_gfg
+    for label in range(num_nodes):
+        node = gfg.nodes[label]
+
+        flags = 0
+        if node.type == "start":
+            flags |= START
+        if node.type == "end":
+            flags |= END
+        if node.is_call:
+            flags |= CALL
+        if node.is_return:
+            flags |= RETURN
+        if node.is_entry:
+            flags |= ENTRY
+        if node.is_exit:
+            flags |= EXIT
+        if node.is_scan:
+            flags |= SCAN
+        if node.is_remaining_sentinal:
+            flags |= SENTINAL
+        compiled.kind[label] = flags
+
+        for dest_label, edge_label in node.outgoing_edges.items():
+            compiled.edge_targets.append(dest_label)
+            compiled.edge_terms.append(term_id(edge_label))
+
+            if node.is_scan:
+                compiled.scan_term[label] = term_id(edge_label)
+                compiled.scan_target[label] = dest_label
+            elif node.is_call:
+                compiled.call_target[label] = dest_label
+            elif node.is_exit:
+                compiled.exit_to_end[label] = dest_label
+        compiled.edge_offsets[label + 1] = len(compiled.edge_targets)
+
+        if node.type == "production":
+            for src_label, edge_label in node.incoming_edges.items():
+                compiled.pred[label] = src_label
+                compiled.pred_term[label] = term_id(edge_label)
+
+    scan_nodes_by_term = [[] for _ in compiled.terminals]
+    for label in range(num_nodes):
+        if compiled.scan_term[label] != EPSILON:
+            scan_nodes_by_term[compiled.scan_term[label]].append(label)
+    for term, scan_nodes in enumerate(scan_nodes_by_term):
+        compiled.term_scan_nodes.extend(scan_nodes)
+        compiled.term_scan_offsets[term + 1] = len(compiled.term_scan_nodes)
+
+    for call_label, return_label in gfg.map_call_to_return.items():
+        compiled.call_to_return[call_label] = return_label
+        compiled.return_to_call[return_label] = call_label
+
+    for start_label, end_label in gfg.map_start_to_end.items():
+        compiled.start_to_end[start_label] = end_label
+        compiled.end_to_start[end_label] = start_label
+
+    for prod_name in gfg.nullable_prods:
+        start_label = gfg.map_prod_name_to_start[prod_name]
+        compiled.kind[start_label] |= NULLABLE
+        compiled.kind[compiled.start_to_end[start_label]] |= NULLABLE
+
+    return compiled
+
+# returns the prediction set of every node: a bitset of the terminal ids that can start the
+# rest of its production (the productions of a start node), or -1 (every bit) if the rest can
+# derive the empty string. bit len(terminals) stands for the end of the input and unknown tokens
+# the sets are computed over the compiled arrays to a fixed point, with bit len(terminals) + 1
+# marking the empty string until the end. node labels increase along a production, so walking
+# them downwards finds the rest of a production already updated and only the calls need
+# another pass
+def compute_predict_sets(compiled):
+    kind = compiled.kind
+    edge_offsets = compiled.edge_offsets
+    edge_targets = compiled.edge_targets
+    scan_term = compiled.scan_term
+    call_target = compiled.call_target
+    call_to_return = compiled.call_to_return
+    end_bit = 1 << len(compiled.terminals)
+    empty = end_bit << 1
+
+    first = [0] * compiled.num_nodes
+    changed = True
+    while changed:
+        changed = False
+        for label in range(compiled.num_nodes - 1, -1, -1):
+            flags = kind[label]
+            if flags & SCAN:
+                term = scan_term[label]
+                bits = end_bit if term == EPSILON else 1 << term
+            elif flags & CALL:
+                bits = first[call_target[label]]
+                if bits & empty:
+                    bits = (bits & ~empty) | first[call_to_return[label]]
+            elif flags & START:
+                bits = 0
+                for edge in range(edge_offsets[label], edge_offsets[label + 1]):
+                    bits |= first[edge_targets[edge]]
+            else:
+                # exit and end nodes
+                bits = empty
+            if bits != first[label]:
+                first[label] = bits
+                changed = True
+
+    return [-1 if bits & empty else bits for bits in first]
@@ -6,8 +6,11 @@ lark_earley_sppf = "lark_earley_sppf"
 lark_cyk_single = "lark_cyk_single"
 spark_earley_single = "spark_earley_single"
 gfg_bottom_up_sppf = "gfg_bottom_up_sppf"
+gfg_recognize = "gfg_recognize"
+gfg_recognize_released = "gfg_recognize_released"
+gfg_top_down_sppf_queue = "gfg_top_down_sppf_queue"
 
-line_colors =['red', 'blue', 'green', 'orange', "purple", 'yellow']
+line_colors =['red', 'blue', 'green', 'orange', "purple", 'yellow', 'black', 'brown', 'cyan']
 
 map_alg_to_color = {
     gfg_single_tree: line_colors[0],
@@ -16,6 +19,9 @@ map_alg_to_color = {
     lark_cyk_single: line_colors[3],
     spark_earley_single: line_colors[4],
     gfg_bottom_up_sppf: line_colors[5],
+    gfg_recognize: line_colors[6],
+    gfg_recognize_released: line_colors[7],
+    gfg_top_down_sppf_queue: line_colors[8],
 }
 
 def read_benchmark_results_from_file(input_file):
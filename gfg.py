@@ -1,8 +1,11 @@
 from expr_lexer import ExprLexer
 from ab_lexer import ABLexer
-from sppf import Sppf
+from sppf import Sppf, CompactSppf
 from old_sppf import Sppf_Old
-import pydot
+from compiled_gfg import compile_gfg, compute_predict_sets, START, END, CALL, RETURN, ENTRY, EXIT, SCAN, SENTINAL, NULLABLE, EPSILON
+from bitset_sigma import BitsetSigmaSet, BitsetTables, bitset_eclosuer, bitset_scan
+from recognizer import Recognizer
+import mmap
 import queue
 import random
 from collections import deque
@@ -10,11 +13,14 @@ from pprint import pprint
 
 # models a single node if the grammar flow graph
 class Node:
-    def __init__(self, label, long_name, type, non_term=""):
+    # production nodes sit at position dot of the right hand side prod_rhs of non_term, the
+    # display name is only formatted when long_name is read
+    def __init__(self, label, type, non_term="", prod_rhs=(), dot=0):
         self.label = label
-        self.long_name = long_name
         self.type = type
         self.non_term = non_term
+        self.prod_rhs = prod_rhs
+        self.dot = dot
         self.is_call = False
         self.is_return = False
         self.is_entry = False
@@ -24,6 +30,16 @@ class Node:
         self.incoming_edges = {}  # Map to store incoming edges (source node: token consumed)
         self.outgoing_edges = {}  # Map to store outgoing edges (destination node: token consumed)
 
+    @property
+    def long_name(self):
+        if self.type == "start":
+            return f"•{self.non_term}"
+        if self.type == "end":
+            return f"{self.non_term}•"
+        prefix = "".join(f"{term}," for term in self.prod_rhs[:self.dot])
+        next_term = self.prod_rhs[self.dot] if self.dot < len(self.prod_rhs) else ""
+        return f"[{self.non_term}→{prefix}•{next_term}]"
+
     def __str__(self):
         return f"{self.long_name}"
     
@@ -38,13 +54,22 @@ class Node:
 
 # models a grammar flow graph
 class GFG:
-    def __init__(self, lexer, use_pydot=True):
+    # worklist selects the eclosuer work queue, "list" for a plain list used as a stack or "queue"
+    # for the thread synchronized queue.Queue it used to be (kept for benchmarking)
+    # build_lexer=False leaves building the lexer to the caller (gfg_cache restores it from disk)
+    # prediction_filter skips the predictions the next token cannot start (see predict_sets),
+    # turn it off for the sigma sets of the paper
+    # leo completes deterministic chains of completions in one step (see leo_top)
+    def __init__(self, lexer, worklist="list", build_lexer=True, prediction_filter=True, leo=True):
         self.nodes = {}
         # self.lexer.tokens defines the set of terminals
         self.lexer = lexer
-        self.lexer.build()
+        if build_lexer:
+            self.lexer.build()
 
-        self.use_pydot = use_pydot
+        self.worklist = worklist
+        self.prediction_filter = prediction_filter
+        self.leo = leo
 
         # maps a production name to the start node label for that production
         self.map_prod_name_to_start = {}
@@ -53,22 +78,30 @@ class GFG:
         self.map_end_to_start = {}
         self.map_call_to_return = {}
         self.map_return_to_call = {}
-        # simply used for debugging to visualize the gfg
-        if self.use_pydot:
-            self.graph = pydot.Dot("my_graph", graph_type="digraph", bgcolor="yellow")
-
-    def add_node(self, label, long_name, type, non_term=""):
-        self.nodes[label] = Node(label, long_name, type)
-        # add node to pydot graph for visualization/debugging only
-        if self.use_pydot:
-            self.graph.add_node(pydot.Node(long_name, shape="circle"))
+        # names of productions that can derive the empty string, set by build_gfg
+        self.nullable_prods = set()
+        # flat array form of the graph the parsers run on, set by compile()
+        self.compiled = None
+        # bitmasks for the bitset sigma set backend, built on first use
+        self.bitset_tables = None
+        # closed zeroth sigma set state shared by every parse for each lookahead, built on first use
+        self.initial_states = {}
+        # compute_predict_sets of the compiled graph, built on first use
+        self.predict = None
+        # grammar the gfg was built from, a gfg loaded from the grammar cache only has the
+        # compiled arrays until the nodes are needed
+        self.productions = None
+        self.start_prod = None
+
+    def add_node(self, label, type, non_term="", prod_rhs=(), dot=0):
+        self.nodes[label] = Node(label, type, non_term, prod_rhs, dot)
         return self.nodes[label]
     
     # create the start and end nodes for a given production, curr_label is the next available
     # int label that can be used to represent a node
     def create_start_end_nodes_for_prod(self, prod_name, curr_label):
-        self.add_node(curr_label, f"•{prod_name}", "start", prod_name)
-        self.add_node(curr_label + 1, f"{prod_name}•", "end", prod_name)
+        self.add_node(curr_label, "start", prod_name)
+        self.add_node(curr_label + 1, "end", prod_name)
 
         # update maps to keep track of relationship between production names and nodes
         self.map_prod_name_to_start[prod_name] = curr_label
@@ -83,18 +116,34 @@ class GFG:
     def add_edge(self, src, dest, label):
         src.outgoing_edges[dest.label] = label
         dest.incoming_edges[src.label] = label
-
-        # optional edges in pydot for gfs visualization, scan edges are black, 
-        # epsilon edges are red
-        if self.use_pydot:
-            color = "red" if label == "" else "black"
-            self.graph.add_edge(pydot.Edge(src.long_name, dest.long_name, label=label, color=color))
         # print(f"\t\t\tcreating edge from {src.long_name} to {dest.long_name} with LABEL: {label}")
 
+    # builds a pydot graph of the gfg for visualization/debugging only, scan edges are black,
+    # epsilon edges are red
+    def to_dot(self):
+        import pydot
+
+        self.require_nodes()
+        graph = pydot.Dot("my_graph", graph_type="digraph", bgcolor="yellow")
+        for label, node in self.nodes.items():
+            graph.add_node(pydot.Node(str(label), label=node.long_name, shape="circle"))
+        for label, node in self.nodes.items():
+            for dest_label, edge_label in node.outgoing_edges.items():
+                color = "red" if edge_label == "" else "black"
+                graph.add_edge(pydot.Edge(str(label), str(dest_label), label=edge_label, color=color))
+        return graph
+
+    # must have graphvis installed for this to work
+    def write_png(self, path):
+        self.to_dot().write_png(path)
+
     # productions is a map string : list(list(str))
     # value is list of possible productions for a given production name
     # each production is a list of token names or production names
     def build_gfg(self, productions, start_producition="S"):
+        self.productions = productions
+        self.start_prod = start_producition
+
         # each node in the graph is assigned an integer label
         curr_label = 0
 
@@ -118,12 +167,10 @@ class GFG:
                 # set if previous node is a call node
                 end_node = None 
                 edge_label = ""
-                prefix_label = f"{prod_name}→"
                 is_entry = True
 
-                for term in prod_rhs:
-                    long_name = f"[{prefix_label}•{term}]" if self.use_pydot else ""
-                    new_node = self.add_node(curr_label, long_name, "production")
+                for dot, term in enumerate(prod_rhs):
+                    new_node = self.add_node(curr_label, "production", prod_name, prod_rhs, dot)
                     curr_label += 1
                     new_node.is_entry = is_entry
                     is_entry = False
@@ -163,13 +210,11 @@ class GFG:
                         print(f"\t\TODO RAISE ERROR unrecognized term: {term}") 
                         return
                     
-                    # update prev_node and prefix_label
+                    # update prev_node
                     prev_node = new_node
-                    prefix_label = prefix_label + f"{term},"
 
                 # reached exit node for current production
-                long_name = f"[{prefix_label}•]" if self.use_pydot else ""
-                exit_node = self.add_node(curr_label, long_name, "production")
+                exit_node = self.add_node(curr_label, "production", prod_name, prod_rhs, len(prod_rhs))
                 curr_label += 1
 
                 exit_node.is_entry = is_entry # may also be entry node if production is A->epsilon
@@ -200,165 +245,521 @@ class GFG:
                         if len(self.nodes[cur_node].incoming_edges) != 1:
                                break
                         cur_node = next(iter(self.nodes[cur_node].incoming_edges.keys()))
+
+        self.nullable_prods = self.compute_nullable(productions)
+
+        self.compile()
+
+    # returns the set of production names that can derive the empty string, a production is
+    # nullable if one of its right hand sides is made up only of nullable productions
+    def compute_nullable(self, productions):
+        nullable = set()
+        changed = True
+        while changed:
+            changed = False
+            for prod_name, prods in productions.items():
+                if prod_name in nullable:
+                    continue
+                for prod_rhs in prods:
+                    if all(term in nullable for term in prod_rhs):
+                        nullable.add(prod_name)
+                        changed = True
+                        break
+        return nullable
+
+    # rebuilds the Node objects of a gfg loaded from the grammar cache, only the visualization and
+    # the old sppf_forward parser read them
+    def require_nodes(self):
+        if not self.nodes:
+            self.build_gfg(self.productions, self.start_prod)
+
+    # returns a Recognizer that is fed one token at a time
+    def recognizer(self):
+        return Recognizer(self)
+
+    # freezes the graph into the integer indexed form used by the parsers, must be called again
+    # if nodes or edges are added after build_gfg
+    def compile(self):
+        self.compiled = compile_gfg(self)
+        self.bitset_tables = None
+        self.initial_states = {}
+        self.predict = None
+        return self.compiled
+
+    # per node bitsets of the terminal ids that can start the rest of the node, see
+    # compute_predict_sets
+    def predict_sets(self):
+        if self.predict is None:
+            self.predict = compute_predict_sets(self.compiled)
+        return self.predict
+
+    # lookahead bit of eclosuer for the next terminal id term, None at the end of the input. None
+    # when prediction_filter is off
+    def lookahead_bit(self, term):
+        if not self.prediction_filter:
+            return None
+        if term is None or term == EPSILON:
+            return 1 << len(self.compiled.terminals)
+        return 1 << term
     
     # implements early recognizer inference rules on page 12 of gfg paper except for scan
     # inference rule which transitions between sigma sets
-    def eclosuer(self, sigma_sets, call_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end):
-        label_queue = queue.Queue()
+    # scan_sigma_sets[i] buckets the scan items of sigma set i by the terminal they consume so the
+    # scan rule only reads the items that advance on the next token
+    # the per position arguments may be lists or dicts keyed by position, sigma_num is the position
+    # to expand and defaults to the last one
+    # lookahead is the lookahead_bit of the next token, calls and entries whose predict_sets do not
+    # have it are not predicted since they cannot scan it. None predicts everything
+    # sigma_leo_tops turns on leo_top completions, the skipped chains are recorded in
+    # sigma_leo_items for expand_leo_items unless it is None (recognizers never expand them)
+    def eclosuer(self, sigma_sets, call_sigma_sets, scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_num=None, lookahead=None,
+                 sigma_leo_tops=None, sigma_leo_items=None):
+        compiled = self.compiled
+        kind = compiled.kind
+        edge_offsets = compiled.edge_offsets
+        edge_targets = compiled.edge_targets
+        edge_terms = compiled.edge_terms
+        scan_term = compiled.scan_term
+        call_target = compiled.call_target
+        call_to_return = compiled.call_to_return
+        start_to_end = compiled.start_to_end
+        predict = self.predict_sets() if lookahead is not None else None
+
+        # the closure is a fixed point so the order items are expanded in does not matter
+        work = []
+        push = work.append
+        pop = work.pop
+        if self.worklist == "queue":
+            label_queue = queue.Queue()
+            push = label_queue.put
+            pop = label_queue.get
+            # underlying deque, empty when the queue is
+            work = label_queue.queue
 
         # last sigma_set is set to expand
-        sigma_num = len(sigma_sets) - 1
+        if sigma_num is None:
+            sigma_num = len(sigma_sets) - 1
         curr_sigma_set = sigma_sets[sigma_num]
+        curr_call_set = call_sigma_sets[sigma_num]
+        curr_scan_set = scan_sigma_sets[sigma_num]
+        curr_end_to_call = sigma_end_to_call[sigma_num]
+        curr_end_to_exit = sigma_end_to_exit[sigma_num]
+        curr_return_to_end = sigma_return_to_end[sigma_num]
+        curr_leo_items = sigma_leo_items[sigma_num] if sigma_leo_tops is not None and sigma_leo_items is not None else None
 
         # add all nodes initially in sigma set to queue to explore from
         for element in curr_sigma_set:
-            label_queue.put(element)
+            push(element)
+
+            if kind[element[0]] & SCAN:
+                curr_scan_set.setdefault(scan_term[element[0]], []).append(element)
 
-        while not label_queue.empty():
-            label, tag = label_queue.get()
+        while work:
+            element = pop()
+            label, tag = element
             # print("label ", label, curr_sigma_set)
 
-            node = self.nodes[label]
+            flags = kind[label]
+
+            if flags & END:
+                # a production that started in an earlier (finished) sigma set and completes a
+                # deterministic chain only adds the topmost end item of the chain
+                if sigma_leo_tops is not None and tag != sigma_num:
+                    top = self.leo_top(sigma_end_to_call, sigma_leo_tops, label, tag)
+                    if top is not None:
+                        if curr_leo_items is not None:
+                            if top in curr_leo_items:
+                                curr_leo_items[top].add(element)
+                            else:
+                                curr_leo_items[top] = {element}
+
+                        if top not in curr_sigma_set:
+                            curr_sigma_set.add(top)
+                            push(top)
+                        continue
 
-            if node.type == "end":
                 # implements end inference rule
                 # may not be any call node for production if the current end node is the end node
                 # of the start production
-                if label in sigma_end_to_call[tag]:
+                callers = sigma_end_to_call[tag].get(label)
+                if callers is not None:
                     # get call nodes that called the production in the tag sigma set
-                    for call_label, call_tag in sigma_end_to_call[tag][label]:
+                    for call_label, call_tag in callers:
                         # get return node associated with the call node
-                        return_label = self.map_call_to_return[call_label]
+                        return_label = call_to_return[call_label]
                         # if return node is not already in the sigma set, add it to the sigma
                         # set and the work queue
                         # tag of return node is set to tag of call node 
                         return_elem = (return_label, call_tag)
 
-                        if return_elem in sigma_return_to_end[sigma_num]:
-                            sigma_return_to_end[sigma_num][return_elem].add((label, tag))
+                        if return_elem in curr_return_to_end:
+                            curr_return_to_end[return_elem].add(element)
                         else:
-                            sigma_return_to_end[sigma_num][return_elem] = {(label, tag)}
+                            curr_return_to_end[return_elem] = {element}
 
 
                         if return_elem not in curr_sigma_set:
                             curr_sigma_set.add(return_elem)
-                            label_queue.put(return_elem)
+                            push(return_elem)
 
-                            if self.nodes[return_elem[0]].is_call:
-                                call_sigma_sets[sigma_num].add(return_elem)
-            elif node.is_call:
+                            if kind[return_label] & CALL:
+                                curr_call_set.add(return_elem)
+                            elif kind[return_label] & SCAN:
+                                curr_scan_set.setdefault(scan_term[return_label], []).append(return_elem)
+            elif flags & CALL:
                 # implements the call inference rule
                 # guaranteed to only be one outgoing edge with empty string edge label
-                for dest_label, edge_label in node.outgoing_edges.items():
-                        # map corresponding end node to call node for when reach end node later
-                        end_label = self.map_start_to_end[dest_label]
-
-                        # add end_label -> (label, tag) to current sigma_end_to_call_map if it
-                        # not already in the map
-                        if end_label in sigma_end_to_call[sigma_num] and (label, tag) not in sigma_end_to_call[sigma_num][end_label]:
-                            # handles case where list of call nodes for end_label already exists
-                            # since there may be multiple call nodes for the same production in the
-                            # sigma set
-                            sigma_end_to_call[sigma_num][end_label].add((label, tag))
-                        elif end_label not in sigma_end_to_call[sigma_num]:
-                            # hanldes case where this is the first call node for the production
-                            sigma_end_to_call[sigma_num][end_label] = {(label, tag)}
-                    
-                        if (dest_label, sigma_num) not in curr_sigma_set:
-                            # adding start node so set tag to current sigma number
-                            curr_sigma_set.add((dest_label, sigma_num))
-                            label_queue.put((dest_label, sigma_num))                                             
+                dest_label = call_target[label]
+                # the called production cannot start with the next token, nullable productions
+                # always pass so the step over the call below is never lost
+                if predict is not None and not predict[dest_label] & lookahead:
+                    continue
+                # map corresponding end node to call node for when reach end node later
+                end_label = start_to_end[dest_label]
+
+                # add end_label -> (label, tag) to current sigma_end_to_call_map, there may be
+                # multiple call nodes for the same production in the sigma set
+                if end_label in curr_end_to_call:
+                    curr_end_to_call[end_label].add(element)
+                else:
+                    curr_end_to_call[end_label] = {element}
+
+                start_elem = (dest_label, sigma_num)
+                if start_elem not in curr_sigma_set:
+                    # adding start node so set tag to current sigma number
+                    curr_sigma_set.add(start_elem)
+                    push(start_elem)
+
+                # called production can derive the empty string so <B•, sigma_num> is (or will be)
+                # in this sigma set, step over the call right away (Aycock and Horspool) since the
+                # end node may already have been expanded before this caller was registered
+                if kind[dest_label] & NULLABLE:
+                    return_label = call_to_return[label]
+                    return_elem = (return_label, tag)
+                    end_elem = (end_label, sigma_num)
+
+                    if return_elem in curr_return_to_end:
+                        curr_return_to_end[return_elem].add(end_elem)
+                    else:
+                        curr_return_to_end[return_elem] = {end_elem}
+
+                    if return_elem not in curr_sigma_set:
+                        curr_sigma_set.add(return_elem)
+                        push(return_elem)
+
+                        if kind[return_label] & CALL:
+                            curr_call_set.add(return_elem)
+                        elif kind[return_label] & SCAN:
+                            curr_scan_set.setdefault(scan_term[return_label], []).append(return_elem)
             else:                
                 # implements start and exit inference rules as these just follow empty string edges
                 # loop through outgoing edges with empty string label
                 # add their dests to same sigma set with same tag
-                for dest_label, edge_label in node.outgoing_edges.items():
-                    if edge_label == "" and (dest_label, tag) not in curr_sigma_set:
+                for edge in range(edge_offsets[label], edge_offsets[label + 1]):
+                    dest_label = edge_targets[edge]
+                    # skip the alternatives of a start node that cannot start with the next token
+                    if predict is not None and flags & START and not predict[dest_label] & lookahead:
+                        continue
+                    dest_elem = (dest_label, tag)
+                    if edge_terms[edge] == EPSILON and dest_elem not in curr_sigma_set:
                         # propagate the current tag
-                        curr_sigma_set.add((dest_label, tag))
-                        label_queue.put((dest_label, tag))
+                        curr_sigma_set.add(dest_elem)
+                        push(dest_elem)
 
-                        if self.nodes[dest_label].is_call:
-                            call_sigma_sets[sigma_num].add((dest_label, tag))
+                        if kind[dest_label] & CALL:
+                            curr_call_set.add(dest_elem)
+                        elif kind[dest_label] & SCAN:
+                            curr_scan_set.setdefault(scan_term[dest_label], []).append(dest_elem)
 
-                    if node.is_exit:
-                        if (dest_label, tag) in sigma_end_to_exit[sigma_num]:
-                            sigma_end_to_exit[sigma_num][(dest_label, tag)].add(label)
+                    if flags & EXIT:
+                        if dest_elem in curr_end_to_exit:
+                            curr_end_to_exit[dest_elem].add(label)
                         else:
-                            sigma_end_to_exit[sigma_num][(dest_label, tag)] = {label}
+                            curr_end_to_exit[dest_elem] = {label}
         
         # print("curr sigma set", curr_sigma_set)
         # print("curr sigma end to call", sigma_end_to_call[-1])
         # print("------------------------")
 
+    # Leo's deterministic reduction paths: completing <B•, tag> is deterministic when sigma set tag
+    # has a single call of B and B is the last symbol of the calling production A, so the caller
+    # completes <A•, call tag> in turn. for right recursive productions the chains grow with the
+    # input and completing them item by item makes parsing quadratic. returns the topmost end item
+    # of the chain starting at <end_label, tag>, or None if that completion is not deterministic.
+    # the result is memoized per production and origin in sigma_leo_tops[tag], sigma set tag and
+    # the sets the chain passes through must be finished
+    def leo_top(self, sigma_end_to_call, sigma_leo_tops, end_label, tag):
+        kind = self.compiled.kind
+        call_to_return = self.compiled.call_to_return
+        exit_to_end = self.compiled.exit_to_end
+
+        # (memo, end label, next end item) for each link walked
+        path = []
+        seen = set()
+        top = None
+        while True:
+            tops = sigma_leo_tops[tag]
+            if end_label in tops:
+                top = tops[end_label]
+                break
+            callers = sigma_end_to_call[tag].get(end_label)
+            # <S•, 0> also completes the parse, so it is never skipped
+            if callers is None or len(callers) != 1 or (end_label, tag) == (1, 0):
+                tops[end_label] = None
+                break
+            call_label, call_tag = next(iter(callers))
+            return_label = call_to_return[call_label]
+            if not kind[return_label] & EXIT:
+                tops[end_label] = None
+                break
+            seen.add((end_label, tag))
+            next_elem = (exit_to_end[return_label], call_tag)
+            # a cycle of unit productions in one sigma set has no top
+            if next_elem in seen:
+                tops[end_label] = None
+                for link_tops, link_label, _ in path:
+                    link_tops[link_label] = None
+                return None
+            path.append((tops, end_label, next_elem))
+            end_label, tag = next_elem
+
+        for link_tops, link_label, next_elem in reversed(path):
+            if top is None:
+                top = next_elem
+            link_tops[link_label] = top
+        return top
+
+    # adds the return to end and end to exit entries of sigma set sigma_num that the chains
+    # completed through top skipped (see leo_top), for the parsers that walk them backwards.
+    # links, if given, gets the (end item, return item, next end item) of every link added
+    def expand_leo_items(self, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_items, sigma_num, top, links=None):
+        items = sigma_leo_items[sigma_num].pop(top, None)
+        if items is None:
+            return
+        call_to_return = self.compiled.call_to_return
+        exit_to_end = self.compiled.exit_to_end
+        curr_end_to_exit = sigma_end_to_exit[sigma_num]
+        curr_return_to_end = sigma_return_to_end[sigma_num]
+
+        for element in items:
+            while element != top:
+                end_label, tag = element
+                call_label, call_tag = next(iter(sigma_end_to_call[tag][end_label]))
+                return_label = call_to_return[call_label]
+                return_elem = (return_label, call_tag)
+                ends = curr_return_to_end.setdefault(return_elem, set())
+                # the rest of the chain is shared with an item expanded before
+                if element in ends:
+                    break
+                ends.add(element)
+                next_element = (exit_to_end[return_label], call_tag)
+                if links is not None:
+                    links.append((element, return_elem, next_element))
+
+                element = next_element
+                curr_end_to_exit.setdefault(element, set()).add(return_label)
+
     # returns True if string is language of grammar of gfg, False otherwise
-    def recognize_string(self,data):
-        self.lexer.input(data)
+    # sigma_backend selects how sigma sets are stored, "set" for sets of (label, tag) tuples or
+    # "bitset" for one bitset of node labels per tag
+    # release_dead_sets runs the string through a Recognizer, which releases the state of each
+    # position as soon as no live item has its tag instead of keeping every sigma set
+    # buffers are per position lists from new_sigma_buffers to reuse across calls
+    def recognize_string(self,data, sigma_backend="set", release_dead_sets=False, buffers=None):
+        if sigma_backend == "bitset":
+            return self.recognize_string_bitset(data)
+        if release_dead_sets:
+            return self.recognize_string_released(data)
+
+        if buffers is None:
+            buffers = self.new_sigma_buffers()
+        sigma_sets = buffers[0]
+        self.fill_sigma_sets(buffers, self.input_term_ids(data))
 
-        sigma_sets = []
-        call_sigma_sets = [set()]
-        # zeroth sigma set initially contains <•S, 0>
-        # implements the init inference rule
-        sigma_sets.append(set([(0, 0)]))
-        # maps an end node of production to all call nodes that invoked that production
-        # in its corresponding sigma set, used from going from an end node to a return node
-        # in the eclosuer function
-        sigma_end_to_call = []
-        sigma_end_to_call.append({})
+        # return whether <S•, 0> is in last sigma set 
+        return (1, 0) in sigma_sets[-1]
 
-        sigma_end_to_exit = []
+    # parses each string of inputs in turn, yielding the results in order. every parse shares the
+    # lexer, the interned terminal ids, the zeroth sigma set and one set of per position buffers
+    # mode picks the parser: "recognize" (recognize_string), "single" (parse_string), "top_down"
+    # (parse_top_down) or "forward" (sppf_forward_inference), kwargs are passed on to it
+    def parse_batch(self, inputs, mode="recognize", **kwargs):
+        parsers = {
+            "recognize": self.recognize_string,
+            "single": self.parse_string,
+            "top_down": self.parse_top_down,
+        }
+        if mode == "forward":
+            for data in inputs:
+                yield self.sppf_forward_inference(data, **kwargs)
+            return
+        if mode not in parsers:
+            raise ValueError(f"unknown parse_batch mode {mode!r}")
+
+        parse = parsers[mode]
+        buffers = self.new_sigma_buffers()
+        for data in inputs:
+            yield parse(data, buffers=buffers, **kwargs)
+
+    # returns an iterator over the terminal ids of the tokens of data. strings and buffers are run
+    # through the lexer one token at a time, so a parser that stops early does not lex the rest and
+    # mapped files are lexed in bounded memory. anything else is taken to be already tokenized into
+    # terminal ids (an array('i') from tokenize_to_array, a numpy array, a list) and is read as is
+    def input_term_ids(self, data):
+        if isinstance(data, (str, bytes, bytearray, mmap.mmap)):
+            self.lexer.input(data)
+            terminal_ids = self.compiled.terminal_ids
+            return (terminal_ids.get(tok.type, EPSILON) for tok in iter(self.lexer.token, None))
+        if hasattr(data, "tolist"):
+            data = data.tolist()
+        return iter(data)
+
+    # per position lists filled in by fill_sigma_sets: sigma_sets, call_sigma_sets,
+    # scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_tops
+    # and sigma_leo_items
+    def new_sigma_buffers(self):
+        return [[] for _ in range(8)]
+
+    # closure of the zeroth sigma set for the lookahead bit of the first token, it is the same for
+    # every input starting with that token and later positions only read it, so it is computed
+    # once per compiled grammar and lookahead and shared by every parse
+    def initial_sigma_state(self, lookahead=None):
+        if lookahead not in self.initial_states:
+            buffers = [[{(0, 0)}], [set()], [{}], [{}], [{}], [{}]]
+            self.eclosuer(*buffers, lookahead=lookahead)
+            self.initial_states[lookahead] = [buf[0] for buf in buffers]
+        return self.initial_states[lookahead]
+
+    # runs the earley recognizer over the terminal ids in term_ids, storing the state of every
+    # position in buffers (see new_sigma_buffers). the lists are cleared first so the same
+    # buffers can be reused for the next input. drop_sigma_sets releases each sigma set once the
+    # next one is built, for callers that only need the other lists afterwards
+    def fill_sigma_sets(self, buffers, term_ids, drop_sigma_sets=False):
+        # the closure of each position is given the token after it
+        term_ids = iter(term_ids)
+        next_term = next(term_ids, None)
+        self.reset_sigma_buffers(buffers, next_term)
+
+        # loop until there are no more input tokens
+        while next_term is not None:
+            term = next_term
+            next_term = next(term_ids, None)
+            self.next_sigma_set(buffers, term, next_term, drop_sigma_sets)
+
+    # clears buffers down to the zeroth position, closed for the first token next_term
+    def reset_sigma_buffers(self, buffers, next_term):
+        for buf in buffers:
+            del buf[1:]
+            if not buf:
+                buf.append(None)
+        self.initial_position(buffers, next_term)
+
+    # stores the zeroth position, closed for the first token next_term, at index position of buffers
+    def initial_position(self, buffers, next_term, position=0):
+        for buf, first in zip(buffers, self.initial_sigma_state(self.lookahead_bit(next_term))):
+            buf[position] = first
+        sigma_end_to_exit, sigma_leo_tops, sigma_leo_items = buffers[4], buffers[6], buffers[7]
+        # parse_string reorders the exit lists while building its tree, so it gets its own map
+        sigma_end_to_exit[position] = dict(sigma_end_to_exit[position])
+        # not part of the shared zeroth state, the leo memo fills in as later positions complete
+        sigma_leo_tops[position] = {}
+        sigma_leo_items[position] = {}
+
+    # appends the position after scanning term to buffers, next_term is the token after term or
+    # None at the end of the input. previous is the index of the position term is scanned from,
+    # the last one by default
+    def next_sigma_set(self, buffers, term, next_term, drop_sigma_sets=False, previous=None):
+        kind = self.compiled.kind
+        scan_target = self.compiled.scan_target
+        sigma_sets, call_sigma_sets, scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_tops, sigma_leo_items = buffers
+        if previous is None:
+            previous = len(sigma_sets) - 1
+
+        # create next sigma set
+        next_set = set()
+        next_call_set = set()
+
+        # loop through the elements in prev sigma set that have an edge with label tok
+        # this is the scan inference rule for the early recognizer on pg 12 of gfg paper
+        for node_label, tag in scan_sigma_sets[previous].get(term, ()):
+            # propagate current tag to next 
+            dest_label = scan_target[node_label]
+            next_set.add((dest_label, tag))
+
+            if kind[dest_label] & CALL:
+                next_call_set.add((dest_label, tag))
+
+        # append the next sigma set and map end to call
+        sigma_sets.append(next_set)
+        if drop_sigma_sets:
+            sigma_sets[previous] = None
+        call_sigma_sets.append(next_call_set)
+        scan_sigma_sets.append({})
+        sigma_end_to_call.append({})
         sigma_end_to_exit.append({})
-
-        sigma_return_to_end = []
         sigma_return_to_end.append({})
-
-        # find all nodes from S• that can be reached by taking empty string edges (essentially)
-        self.eclosuer(sigma_sets, call_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end)
-
-        # loop until there are no more input tokens (there is probably a better way to write this)
-        while True:
-            # get next token in the input
-            tok = self.lexer.token()
-            # check if reached end of input
-            if not tok:
+        sigma_leo_tops.append({})
+        sigma_leo_items.append({})
+        # eclosuer updates both next_set and the last map in sigma_end_to_call
+        self.eclosuer(sigma_sets, call_sigma_sets, scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end,
+                      lookahead=self.lookahead_bit(next_term), sigma_leo_tops=sigma_leo_tops if self.leo else None,
+                      sigma_leo_items=sigma_leo_items)
+
+    # recognize_string keeping only live positions, see recognizer.py
+    def recognize_string_released(self, data):
+        recognizer = self.recognizer()
+
+        for term in self.input_term_ids(data):
+            # stop on the first token that cannot be scanned
+            if not recognizer.feed_term(term):
                 break
 
-            # create next sigma set
-            next_set = set()
-            next_call_set = set()
+        return recognizer.finish()
 
-            # loop through all elements in prev sigma set and see if there is an edge with label tok
-            # this is the scan inference rule for the early recognizer on pg 12 of gfg paper
-            for element in sigma_sets[-1]:
-                node_label, tag = element
-                node = self.nodes[node_label]
+    # recognize_string with sigma sets stored as per tag bitsets, see bitset_sigma.py
+    def recognize_string_bitset(self, data):
+        if self.bitset_tables is None:
+            self.bitset_tables = BitsetTables(self.compiled)
+        tables = self.bitset_tables
 
-                if node.is_scan:
-                    for dest_label, edge_label in node.outgoing_edges.items():
-                        if (edge_label == tok.type):
-                            # propagate current tag to next 
-                            next_set.add((dest_label, tag))
+        # zeroth sigma set initially contains <•S, 0>
+        first_set = BitsetSigmaSet()
+        first_set.add(0, 0)
+        sigma_sets = [first_set]
+        sigma_end_to_call = [{}]
 
-                            if self.nodes[dest_label].is_call:
-                                next_call_set.add((dest_label, tag))
+        bitset_eclosuer(tables, sigma_sets, sigma_end_to_call)
 
-            # append the next sigma set and map end to call
-            sigma_sets.append(next_set)
-            call_sigma_sets.append(next_call_set)
+        for term in self.input_term_ids(data):
+            sigma_sets.append(bitset_scan(tables, sigma_sets[-1], term))
             sigma_end_to_call.append({})
-            sigma_end_to_exit.append({})
-            sigma_return_to_end.append({})
-            # eclosuer updates both next_set and the last map in sigma_end_to_call
-            self.eclosuer(sigma_sets, call_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end)
-        
+            bitset_eclosuer(tables, sigma_sets, sigma_end_to_call)
+
         # return whether <S•, 0> is in last sigma set 
         return (1, 0) in sigma_sets[-1]
     
-    def sppf_forward_inference(self, data, start_prod="S"):
-        self.lexer.input(data)
-        sigma_sets = [set() for x in range(len(data) + 1)]
+    # compact_sppf builds the forest in a CompactSppf instead of a Sppf
+    def sppf_forward_inference(self, data, start_prod="S", compact_sppf=False):
+        term_ids = self.input_term_ids(data)
+        compiled = self.compiled
+        kind = compiled.kind
+        edge_offsets = compiled.edge_offsets
+        edge_targets = compiled.edge_targets
+        scan_term = compiled.scan_term
+        scan_target = compiled.scan_target
+        call_target = compiled.call_target
+        exit_to_end = compiled.exit_to_end
+        call_to_return = compiled.call_to_return
+        start_to_end = compiled.start_to_end
+        end_to_start = compiled.end_to_start
+
+        # grown one position per token, so buffer inputs do not allocate a set per byte
+        sigma_sets = [set()]
+        # callers[i] maps the start label of a production to the call items in sigma_sets[i] that
+        # call it, so an end node finds its callers without scanning the whole origin set
+        callers = [{}]
         self.family_map = {}
-        sppf = Sppf(self.use_pydot) 
+        sppf = CompactSppf() if compact_sppf else Sppf()
 
         Q_p = set()
         R = set()
@@ -367,37 +768,64 @@ class GFG:
         start_node = self.map_prod_name_to_start[start_prod]
         sigma_sets[0].add((start_node, 0, -1)) # just add the start node
 
-        for i in range(len(data) + 1):
+        # the token after position i, read before its closure so predictions it cannot start are
+        # skipped (see eclosuer)
+        predict = self.predict_sets() if self.prediction_filter else None
+        in_term = next(term_ids, None)
+
+        i = 0
+        while True:
+            lookahead = self.lookahead_bit(in_term)
+
             R = sigma_sets[i].copy()
-            H = {} # used for epsilon productions
             Q = Q_p
             Q_p = set()
 
             # start speculative phase
             while len(R) > 0:
                 cur_node_idx, cur_node_tag, cur_node_sppf = R.pop()
-
-                # calls should goto their starts
-                if self.nodes[cur_node_idx].is_call:
-                    for target, token in self.nodes[cur_node_idx].outgoing_edges.items():
-                        e_item = (target, i, -1)
-                        if e_item not in sigma_sets[i]:
-                            R.add(e_item)
-                            sigma_sets[i].add(e_item)
+                flags = kind[cur_node_idx]
+
+                # calls should goto their starts, unless the called production cannot start with the
+                # next token (nullable productions always can)
+                if flags & CALL and (predict is None or predict[call_target[cur_node_idx]] & lookahead):
+                    target = call_target[cur_node_idx]
+                    # every item of sigma_sets[i] passes through R so this indexes all its calls
+                    if target in callers[i]:
+                        callers[i][target].append((cur_node_idx, cur_node_tag, cur_node_sppf))
+                    else:
+                        callers[i][target] = [(cur_node_idx, cur_node_tag, cur_node_sppf)]
+
+                    e_item = (target, i, -1)
+                    if e_item not in sigma_sets[i]:
+                        R.add(e_item)
+                        sigma_sets[i].add(e_item)
+
+                    # the called production can derive the empty string, step over the call now
+                    # using its (B•, i, i) sppf node instead of waiting for the end node to look
+                    # back through this sigma set
+                    if kind[target] & NULLABLE:
+                        end_node = start_to_end[target]
+                        end_sppf_node = (end_node, i, i)
+                        sppf.add_node(end_sppf_node, "symbol")
+                        ret_node = call_to_return[cur_node_idx]
+                        new_sppf_node = self.make_forward_node_inference(ret_node, cur_node_tag, i, cur_node_sppf, end_sppf_node, sppf)
+                        new_item = (ret_node, cur_node_tag, new_sppf_node)
+                        if new_item not in sigma_sets[i]:
+                            R.add(new_item)
+                            sigma_sets[i].add(new_item)
 
                 # scan nodes should be added to Q
-                if self.nodes[cur_node_idx].is_scan and self.nodes[cur_node_idx].is_entry:
-                    for target, token in self.nodes[cur_node_idx].outgoing_edges.items():
-                        Q.add((cur_node_idx, i, -1))
+                if flags & SCAN and flags & ENTRY:
+                    Q.add((cur_node_idx, i, -1))
                 
-                if self.nodes[cur_node_idx].is_scan and self.nodes[cur_node_idx].is_return:
-                    for target, token in self.nodes[cur_node_idx].outgoing_edges.items():
-                        Q.add((cur_node_idx, cur_node_tag, cur_node_sppf))
+                if flags & SCAN and flags & RETURN:
+                    Q.add((cur_node_idx, cur_node_tag, cur_node_sppf))
                 
                 # exit from an epsilon
-                if self.nodes[cur_node_idx].is_exit and cur_node_sppf == -1:
-                    sppf.add_node((cur_node_idx, i, i), str(self.nodes[cur_node_idx]), "")
-                    sppf.add_node(("ϵ", i, i), "ϵ", "")
+                if flags & EXIT and cur_node_sppf == -1:
+                    sppf.add_node((cur_node_idx, i, i), "symbol")
+                    sppf.add_node(("ϵ", i, i), "symbol")
                     sppf.add_edge((cur_node_idx, i, i), ("ϵ", i, i))
                     cur_item = (cur_node_idx, cur_node_tag, cur_node_sppf)
                     sigma_sets[i].remove(cur_item)
@@ -405,75 +833,74 @@ class GFG:
                     R.add((cur_node_idx, cur_node_tag, (cur_node_idx, i, i)))
 
                 #exits just add the end
-                if self.nodes[cur_node_idx].is_exit and cur_node_sppf != -1:
-                    end_node = list(self.nodes[cur_node_idx].outgoing_edges)[0]
+                if flags & EXIT and cur_node_sppf != -1:
+                    end_node = exit_to_end[cur_node_idx]
                     # create the end sppf node
                     new_sppf_node = self.make_forward_node_inference(end_node, cur_node_tag, i, cur_node_sppf, -1, sppf)
                     assert(new_sppf_node != -1)
                     e_item = (end_node, cur_node_tag, new_sppf_node)
-                    assert(self.nodes[end_node].type == "end")
+                    assert(kind[end_node] & END)
                     R.add(e_item)
                     sigma_sets[i].add(e_item)
                 
                 # start nodes should explore all the prods with tag i
-                if self.nodes[cur_node_idx].type == "start":
-                    for target, token in self.nodes[cur_node_idx].outgoing_edges.items():
-                        e_item = (target, i, -1)
+                if flags & START:
+                    for edge in range(edge_offsets[cur_node_idx], edge_offsets[cur_node_idx + 1]):
+                        if predict is not None and not predict[edge_targets[edge]] & lookahead:
+                            continue
+                        e_item = (edge_targets[edge], i, -1)
                         if e_item not in sigma_sets[i]:
                             R.add(e_item)
                             sigma_sets[i].add(e_item)                    
 
-                # end nodes need to return properly
-                if self.nodes[cur_node_idx].type == "end":
-                    # find the person that called the thing we ended
-                    start_node = self.map_end_to_start[cur_node_idx]
-                    new_sigma_items = set()
-                    for caller_node_idx, caller_node_tag, caller_node_sppf in sigma_sets[cur_node_tag]:
-                        if self.nodes[caller_node_idx].is_call:
-                            target_start = list(self.nodes[caller_node_idx].outgoing_edges)[0]
-                            # this is maybe the item that called us
-                            if target_start == start_node:
-                                ret_node = self.map_call_to_return[caller_node_idx]
-                                new_sppf_node = self.make_forward_node_inference(ret_node, caller_node_tag, i, caller_node_sppf, cur_node_sppf, sppf)
-                                new_item = (ret_node, caller_node_tag, new_sppf_node)
-                                if new_item not in sigma_sets[i]:
-                                    if i != cur_node_tag:
-                                        R.add(new_item)
-                                        sigma_sets[i].add(new_item)
-                                    else:
-                                        R.add(new_item)
-                                        new_sigma_items.add(new_item)
-                    for x in new_sigma_items:
-                        sigma_sets[i].add(x) 
+                # end nodes need to return properly, productions that ended in the sigma set they
+                # started in are nullable and their callers already stepped over them
+                if flags & END and cur_node_tag != i:
+                    # find the items that called the thing we ended, sigma_sets[cur_node_tag] is
+                    # finished so its index is complete
+                    start_node = end_to_start[cur_node_idx]
+                    for caller_node_idx, caller_node_tag, caller_node_sppf in callers[cur_node_tag].get(start_node, ()):
+                        ret_node = call_to_return[caller_node_idx]
+                        new_sppf_node = self.make_forward_node_inference(ret_node, caller_node_tag, i, caller_node_sppf, cur_node_sppf, sppf)
+                        new_item = (ret_node, caller_node_tag, new_sppf_node)
+                        if new_item not in sigma_sets[i]:
+                            R.add(new_item)
+                            sigma_sets[i].add(new_item)
             
             # make the token node
-            in_tok = self.lexer.token() 
-            in_tok = in_tok.type if in_tok is not None else None
-            if in_tok is not None:
-                sppf.add_node((in_tok, i, i+1), in_tok, "")
+            # nothing can be scanned past the last token
+            if in_term is None:
+                break
+            # a token the grammar does not know is never scanned, so it needs no node
+            if in_term != EPSILON:
+                in_tok = compiled.terminals[in_term]
+                sppf.add_node((in_tok, i, i+1), "symbol")
                 v = (in_tok, i, i+1)
+            sigma_sets.append(set())
+            callers.append({})
             
 
             # scanned forward. glue to created node, and put in next sigma set
             while len(Q) > 0:
                 cur_node_idx, cur_node_tag, cur_node_sppf = Q.pop()
-                for target, token in self.nodes[cur_node_idx].outgoing_edges.items():
-                    if token != in_tok:
-                        continue
-                    y = self.make_forward_node_inference(target, cur_node_tag, i+1, cur_node_sppf, v, sppf)
-                    e_item = (target, cur_node_tag, y)
-                    
-                    # scan through and add it to the next set
-                    if self.nodes[target].is_remaining_sentinal or self.nodes[target].is_call:
-                        sigma_sets[i+1].add(e_item)
-            
-                    # scan once again to keep Q' populated with ongoing terminal parses
-                    for _, token in self.nodes[target].outgoing_edges.items():
-                        if in_tok is not None and token == in_tok:
-                            Q_p.add(e_item)
+                if scan_term[cur_node_idx] != in_term:
+                    continue
+                target = scan_target[cur_node_idx]
+                y = self.make_forward_node_inference(target, cur_node_tag, i+1, cur_node_sppf, v, sppf)
+                e_item = (target, cur_node_tag, y)
+                
+                # scan through and add it to the next set
+                if kind[target] & (SENTINAL | CALL):
+                    sigma_sets[i+1].add(e_item)
+        
+                # scan once again to keep Q' populated with ongoing terminal parses, the next
+                # token is checked when Q' is scanned
+                if kind[target] & SCAN:
+                    Q_p.add(e_item)
+            in_term = next(term_ids, None)
+            i += 1
         
         return sppf
-        return False
                         
     def make_forward_node_inference(self, gfg_item, start_index, end_index, existing_node, new_node, sppf):
         if existing_node == -1 and new_node == -1:
@@ -481,23 +908,24 @@ class GFG:
         # no existing tag node then we can just create the new node and make it a child
         if existing_node != -1 and new_node != -1:
             # this item
-            sppf.add_node((gfg_item, start_index, end_index), str(self.nodes[gfg_item]), "")
+            sppf.add_node((gfg_item, start_index, end_index), "symbol")
             sppf.add_family((gfg_item, start_index, end_index), existing_node, new_node)
             return (gfg_item, start_index, end_index)
         elif existing_node == -1:
-            sppf.add_node((gfg_item, start_index, end_index), str(self.nodes[gfg_item]), "")
+            sppf.add_node((gfg_item, start_index, end_index), "symbol")
             sppf.add_edge((gfg_item, start_index, end_index), new_node)
             return (gfg_item, start_index, end_index)
         elif new_node == -1:
-            sppf.add_node((gfg_item, start_index, end_index), str(self.nodes[gfg_item]), "")
+            sppf.add_node((gfg_item, start_index, end_index), "symbol")
             sppf.add_edge((gfg_item, start_index, end_index), existing_node)
             return (gfg_item, start_index, end_index)
 
-    def sppf_forward(self, data, start_producition="S"):
+    def sppf_forward(self, data, start_producition="S", use_dot=True):
+        self.require_nodes()
         self.lexer.input(data)
         sigma_sets = [set() for x in range(len(data) + 1)]
         self.family_map = {}
-        sppf = Sppf_Old(self.use_pydot)
+        sppf = Sppf_Old(use_dot)
 
         Q_p = set() # scan forward elements 
         R = set() # set of items that need to be processed to add to cur sigma
@@ -712,65 +1140,15 @@ class GFG:
             y = attempted_node
         return y
 
-    def parse_string(self,data):
-        self.lexer.input(data)
-
-        sigma_sets = []
-        call_sigma_sets = [set()]
-        # zeroth sigma set initially contains <•S, 0>
-        # implements the init inference rule
-        sigma_sets.append(set([(0, 0)]))
-        # maps an end node of production to all call nodes that invoked that production
-        # in its corresponding sigma set, used from going from an end node to a return node
-        # in the eclosuer function
-        sigma_end_to_call = []
-        sigma_end_to_call.append({})
+    def parse_string(self,data, buffers=None):
+        compiled = self.compiled
+        kind = compiled.kind
 
-        sigma_end_to_exit = []
-        sigma_end_to_exit.append({})
+        if buffers is None:
+            buffers = self.new_sigma_buffers()
+        self.fill_sigma_sets(buffers, self.input_term_ids(data))
+        sigma_sets, call_sigma_sets, scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_tops, sigma_leo_items = buffers
 
-        sigma_return_to_end = []
-        sigma_return_to_end.append({})
-
-        # find all nodes from S• that can be reached by taking empty string edges (essentially)
-        self.eclosuer(sigma_sets, call_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end)
-
-        # loop until there are no more input tokens (there is probably a better way to write this)
-        while True:
-            # get next token in the input
-            tok = self.lexer.token()
-            # check if reached end of input
-            if not tok:
-                break
-
-            # create next sigma set
-            next_set = set()
-            next_call_set = set()
-
-            # loop through all elements in prev sigma set and see if there is an edge with label tok
-            # this is the scan inference rule for the early recognizer on pg 12 of gfg paper
-            for element in sigma_sets[-1]:
-                node_label, tag = element
-                node = self.nodes[node_label]
-
-                if node.is_scan:
-                    for dest_label, edge_label in node.outgoing_edges.items():
-                        if (edge_label == tok.type):
-                            # propagate current tag to next 
-                            next_set.add((dest_label, tag))
-
-                            if self.nodes[dest_label].is_call:
-                                next_call_set.add((dest_label, tag))
-
-            # append the next sigma set and map end to call
-            sigma_sets.append(next_set)
-            call_sigma_sets.append(next_call_set)
-            sigma_end_to_call.append({})
-            sigma_end_to_exit.append({})
-            sigma_return_to_end.append({})
-            # eclosuer updates both next_set and the last map in sigma_end_to_call
-            self.eclosuer(sigma_sets, call_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end)
-        
         # return whether <S•, 0> is in last sigma set 
         if (1, 0) not in sigma_sets[-1]:
             return False
@@ -786,17 +1164,23 @@ class GFG:
 
         processed = set()
 
+        pred = compiled.pred
+        pred_term = compiled.pred_term
+        return_to_call = compiled.return_to_call
+        end_to_start = compiled.end_to_start
+        terminals = compiled.terminals
+
         while (curr_elem != (0, 0)):
             label, tag = curr_elem
 
-            node = self.nodes[label]
+            flags = kind[label]
             # print(curr_sigma_num, f"Current elemn is ({self.nodes[label].long_name}, {tag}, {curr_sigma_num})")
 
-            if node.type == "start":
+            if flags & START:
                 # implements CALL^-1 rule on pg 12
                 curr_elem = stack.pop()
                 output_stack.pop()
-            elif node.type == "end":
+            elif flags & END:
                 # print(f"({self.nodes[label].long_name}, {tag}, {curr_sigma_num})")
                 # implements EXIT^-1 rule, has non determinism
                 # At A•, go to A->something•, may be multiple possible values
@@ -816,6 +1200,9 @@ class GFG:
                 #         output_stack.append((prod_name, prod_children))
                 #         break
 
+                if sigma_leo_items[curr_sigma_num]:
+                    self.expand_leo_items(sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_items, curr_sigma_num, curr_elem)
+
                 if (label, tag, curr_sigma_num) in processed:
                     # already processed end label, randomize list of productions that produced end node
                     # to get out of cycle
@@ -827,7 +1214,7 @@ class GFG:
                 for exit_label in sigma_end_to_exit[curr_sigma_num][(label, tag)]:
                     curr_elem = (exit_label, tag)
 
-                    prod_name = self.map_start_to_prod_name[self.map_end_to_start[label]]
+                    prod_name = self.map_start_to_prod_name[end_to_start[label]]
 
                     prod_children = deque([])
                     if len(output_stack) != 0:
@@ -837,19 +1224,18 @@ class GFG:
                     output_stack.append((prod_name, prod_children))
                     break
 
-            elif node.is_entry:
+            elif flags & ENTRY:
                 # implements START^-1 rule on pg 12
                 # node is A->•something, go back to •A
                 # keep same tag
                 # there will only be one incoming edge
-                for src_label in node.incoming_edges:
-                    curr_elem = (src_label, tag)
-            elif node.is_return:
+                curr_elem = (pred[label], tag)
+            elif flags & RETURN:
                 # implements END^-1 rule, has non determinism
                 # at A->aB•g, go to B• and add A->a•Bg to stack
                 
 
-                call_label = self.map_return_to_call[label]
+                call_label = return_to_call[label]
 
                 # there will only be one incoming edge from B•
                 # OLD inefficient code but pretty sure correct
@@ -874,68 +1260,87 @@ class GFG:
                 # implements SCAN^-1 rule on pg 12
                 # go to previous sigma set
                 # there will only be one incoming edge
-                for src_label, edge_label in node.incoming_edges.items():
-                    if edge_label == "":
-                        print ("ERROR EXPECTING SCAN EDGE, got empty edge")
-                        return False
-                    else:
-                        output_stack[-1][1].appendleft(edge_label)
-                        curr_elem = (src_label, tag)
-                        curr_sigma_num -= 1
+                if pred_term[label] == EPSILON:
+                    print ("ERROR EXPECTING SCAN EDGE, got empty edge")
+                    return False
+                else:
+                    output_stack[-1][1].appendleft(terminals[pred_term[label]])
+                    curr_elem = (pred[label], tag)
+                    curr_sigma_num -= 1
 
         return output_stack[0]
 
 
-    def is_node_one_before_start(self, node):
-        if node.is_entry:
+    def is_node_one_before_start(self, label):
+        compiled = self.compiled
+        flags = compiled.kind[label]
+        if flags & ENTRY:
             return False
-        if node.is_return:
-            return self.nodes[self.map_return_to_call[node.label]].is_entry
+        if flags & RETURN:
+            return compiled.kind[compiled.return_to_call[label]] & ENTRY != 0
         else:
-            for src_label in node.incoming_edges:
-                return self.nodes[src_label].is_entry
+            return compiled.kind[compiled.pred[label]] & ENTRY != 0
+
+    # sigma_end_to_call and sigma_leo_items expand the completions leo_top skipped as they are reached
+    # reuse(node_def, sppf) is called on every node before it is expanded and returns True when it
+    # filled in the children of the node itself (see incremental.py)
+    # sigma_previous maps each position to the one before it, for callers whose positions are not
+    # numbered in input order (see incremental.py)
+    def get_sppf(self, sigma_sets, sigma_return_to_end, sigma_end_to_exit, stack, sppf, sigma_end_to_call=None, sigma_leo_items=None, reuse=None,
+                 sigma_previous=None):
+        compiled = self.compiled
+        kind = compiled.kind
+        pred = compiled.pred
+        pred_term = compiled.pred_term
+        return_to_call = compiled.return_to_call
+        terminals = compiled.terminals
 
-    def get_sppf(self, sigma_sets, sigma_return_to_end, sigma_end_to_exit, stack, sppf):
         while len(stack) > 0:
             curr_node = stack.pop()
+            if reuse is not None and reuse(curr_node, sppf):
+                continue
             label, tag, curr_sigma_num = curr_node
 
-            # gfg node that corresponds to with the current label of the current sigma set element
-            gfg_node = self.nodes[label]
+            # kind of the gfg node that corresponds to the current label of the current sigma set element
+            flags = kind[label]
+            is_production = not flags & (START | END)
             
             # case where at A•
             # implements EXIT^-1
-            if gfg_node.type == "end":
+            if flags & END:
                 # prod_name = self.map_start_to_prod_name[self.map_end_to_start[label]]
                 # print(f"({prod_name}, {tag}, {curr_sigma_num})")
 
+                if sigma_leo_items is not None and sigma_leo_items[curr_sigma_num]:
+                    self.expand_leo_items(sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_items, curr_sigma_num, (label, tag))
+
                 # at <A•, tag> in E_curr_sigma_num, loop though all <A->something•, tag> in E_curr_sigma_num
                 for exit_label in sigma_end_to_exit[curr_sigma_num][(label, tag)]:
                     next_node = (exit_label, tag, curr_sigma_num)
                     if next_node not in sppf.nodes: 
                         stack.append(next_node)
-                        sppf.add_node(next_node, self.nodes[exit_label].long_name, "intermediate")
+                        sppf.add_node(next_node, "intermediate")
                     
 
                     sppf.add_edge(curr_node, next_node)  
 
             # empty production
             # Implements START^-1
-            elif gfg_node.type == "production" and gfg_node.is_entry:
+            elif is_production and flags & ENTRY:
                 assert tag == curr_sigma_num
-                # print(f"in empty string case {gfg_node.long_name}")
+                # print(f"in empty string case {self.nodes[label].long_name}")
 
                 epsilon_node = ("ϵ", 0, 0)
-                sppf.add_node(epsilon_node, "ϵ", "symbol")
+                sppf.add_node(epsilon_node, "symbol")
                     
 
                 sppf.add_edge(curr_node, epsilon_node)
             # # At A -> B•c
             # # implements ENTRY_END^-1
-            elif gfg_node.type == "production" and self.is_node_one_before_start(gfg_node) and gfg_node.is_return:
-                # print(f"({gfg_node.long_name}, {tag}, {curr_sigma_num})")
+            elif is_production and self.is_node_one_before_start(label) and flags & RETURN:
+                # print(f"({self.nodes[label].long_name}, {tag}, {curr_sigma_num})")
 
-                call_label = self.map_return_to_call[label]
+                call_label = return_to_call[label]
 
                 end_labels = sigma_return_to_end[curr_sigma_num][(label, tag)]
                 for src_label, src_tag in end_labels:
@@ -943,30 +1348,31 @@ class GFG:
                         symbol_node = (src_label, src_tag, curr_sigma_num)
                         if symbol_node not in sppf.nodes: 
                             stack.append(symbol_node)
-                            sppf.add_node(symbol_node, self.nodes[src_label].long_name, "symbol")
+                            sppf.add_node(symbol_node, "symbol")
 
                         sppf.add_edge(curr_node, symbol_node)
 
             # # At A -> a•c
             # # implements ENTRY_SCAN^-1
-            elif gfg_node.type == "production" and self.is_node_one_before_start(gfg_node):
+            elif is_production and self.is_node_one_before_start(label):
                 # one terminal before start of produciton: EX A->a*B
-                # print(f" one terminal before start ({gfg_node.long_name}, {tag}, {curr_sigma_num})")
+                # print(f" one terminal before start ({self.nodes[label].long_name}, {tag}, {curr_sigma_num})")
 
                 # will only be one incoming edge
-                for src_label, edge_label in gfg_node.incoming_edges.items():
-                    terminal_node = (edge_label, curr_sigma_num - 1, curr_sigma_num)
+                edge_label = terminals[pred_term[label]]
+                prev_sigma_num = curr_sigma_num - 1 if sigma_previous is None else sigma_previous[curr_sigma_num]
+                terminal_node = (edge_label, prev_sigma_num, curr_sigma_num)
 
-                    sppf.add_node(terminal_node, edge_label, "symbol")
+                sppf.add_node(terminal_node, "symbol")
 
-                    sppf.add_edge(curr_node, terminal_node)
+                sppf.add_edge(curr_node, terminal_node)
 
             # # At A ->aB•c
             # # implements END^-1
-            elif gfg_node.type == "production" and gfg_node.is_return:
-                # print(f"({gfg_node.long_name}, {tag}, {curr_sigma_num})")
+            elif is_production and flags & RETURN:
+                # print(f"({self.nodes[label].long_name}, {tag}, {curr_sigma_num})")
 
-                call_label = self.map_return_to_call[label]
+                call_label = return_to_call[label]
 
                 end_labels = sigma_return_to_end[curr_sigma_num][(label, tag)]
                 for src_label, src_tag in end_labels:
@@ -974,12 +1380,12 @@ class GFG:
                         production_node = (src_label, src_tag, curr_sigma_num)
                         if production_node not in sppf.nodes: 
                             stack.append(production_node)
-                            sppf.add_node(production_node, self.nodes[src_label].long_name, "symbol")              
+                            sppf.add_node(production_node, "symbol")              
 
                         prefix_node = (call_label, tag, src_tag)
                         if prefix_node not in sppf.nodes: 
                             stack.append(prefix_node)
-                            sppf.add_node(prefix_node, self.nodes[call_label].long_name, "symbol")
+                            sppf.add_node(prefix_node, "symbol")
                         
 
                         sppf.add_family(curr_node, prefix_node, production_node)
@@ -987,101 +1393,61 @@ class GFG:
 
             # # At A-> ab•c
             # # implements SCAN^-1
-            elif gfg_node.type == "production":
-                # print(f"({gfg_node.long_name}, {tag}, {curr_sigma_num})")
+            elif is_production:
+                # print(f"({self.nodes[label].long_name}, {tag}, {curr_sigma_num})")
 
                 # will only be one incoming edge
-                for src_label, edge_label in gfg_node.incoming_edges.items():
-                    terminal_node = (edge_label, curr_sigma_num - 1, curr_sigma_num)
-                    sppf.add_node(terminal_node, edge_label, "symbol")
+                src_label = pred[label]
+                edge_label = terminals[pred_term[label]]
+                prev_sigma_num = curr_sigma_num - 1 if sigma_previous is None else sigma_previous[curr_sigma_num]
+                terminal_node = (edge_label, prev_sigma_num, curr_sigma_num)
+                sppf.add_node(terminal_node, "symbol")
 
-                    prefix_node = (src_label, tag, curr_sigma_num - 1) 
+                prefix_node = (src_label, tag, prev_sigma_num) 
 
-                    if prefix_node not in self.nodes:
-                        stack.append(prefix_node)
-                        sppf.add_node(prefix_node, self.nodes[src_label].long_name, "intermediate")
+                if prefix_node not in self.nodes:
+                    stack.append(prefix_node)
+                    sppf.add_node(prefix_node, "intermediate")
 
-                    sppf.add_family(curr_node, prefix_node, terminal_node)
+                sppf.add_family(curr_node, prefix_node, terminal_node)
     
     
-    def parse_top_down(self, data, use_pydot=True):
-        self.lexer.input(data)
-
-        # zeroth sigma set initially contains <•S, 0>
-        # implements the init inference rule
-        sigma_sets = [set([(0, 0)])]
-        call_sigma_sets = [set()]
-        
-        # maps an end node of production to all call nodes that invoked that production
-        # in its corresponding sigma set, used from going from an end node to a return node
-        # in the eclosuer function
-        sigma_end_to_call = []
-        sigma_end_to_call.append({})
+    # compact_sppf builds the forest in a CompactSppf instead of a Sppf
+    def parse_top_down(self, data, compact_sppf=False, buffers=None):
+        if buffers is None:
+            buffers = self.new_sigma_buffers()
+        # only the last sigma set is read afterwards, get_sppf walks the call sigma sets
+        self.fill_sigma_sets(buffers, self.input_term_ids(data), drop_sigma_sets=True)
+        return self.build_sppf(buffers, CompactSppf() if compact_sppf else Sppf())
+
+    # builds the forest of the filled buffers into the empty sppf, returns False if the input was
+    # not in the language
+    def build_sppf(self, buffers, sppf):
+        sigma_sets, call_sigma_sets, scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_tops, sigma_leo_items = buffers
 
-        sigma_end_to_exit = []
-        sigma_end_to_exit.append({})
-
-        sigma_return_to_end = []
-        sigma_return_to_end.append({})
-
-        # find all nodes from S• that can be reached by taking empty string edges (essentially)
-        self.eclosuer(sigma_sets, call_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end)
-
-        # loop until there are no more input tokens (there is probably a better way to write this)
-        while True:
-            # get next token in the input
-            tok = self.lexer.token()
-            # check if reached end of input
-            if not tok:
-                break
-
-            # create next sigma set
-            next_set = set()
-            next_call_set = set()
-
-            # loop through all elements in prev sigma set and see if there is an edge with label tok
-            # this is the scan inference rule for the early recognizer on pg 12 of gfg paper
-            for element in sigma_sets[-1]:
-                node_label, tag = element
-                node = self.nodes[node_label]
-
-                if node.is_scan:
-                    for dest_label, edge_label in node.outgoing_edges.items():
-                        if (edge_label == tok.type):
-                            # propagate current tag to next 
-                            next_set.add((dest_label, tag))
-
-                            if self.nodes[dest_label].is_call:
-                                next_call_set.add((dest_label, tag))
-
-            # append the next sigma set and map end to call
-            sigma_sets.append(next_set)
-            sigma_sets[-2] = None
-            call_sigma_sets.append(next_call_set)
-            sigma_end_to_call.append({})
-            sigma_end_to_exit.append({})
-            sigma_return_to_end.append({})
-            # eclosuer updates both next_set and the last map in sigma_end_to_call
-            self.eclosuer(sigma_sets, call_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end)
-        
         # return whether <S•, 0> is in last sigma set 
         if (1, 0) not in sigma_sets[-1]:
             return False
         
         # string is in grammar, traverse backwards through sigma sets to build a parse tree
 
-        sppf = Sppf(use_pydot and self.use_pydot)
-
         # INIT RULE
-        root_node_def = (1, 0, len(data))
-        sppf.add_node(root_node_def, self.nodes[1].long_name, "symbol")
+        # one position per token, which is not len(data) when the input has ignored characters
+        root_node_def = (1, 0, len(call_sigma_sets) - 1)
+        sppf.add_node(root_node_def, "symbol")
 
         node_stack = []
         node_stack.append(root_node_def)
 
-        self.get_sppf(call_sigma_sets, sigma_return_to_end, sigma_end_to_exit, node_stack, sppf)
+        self.get_sppf(call_sigma_sets, sigma_return_to_end, sigma_end_to_exit, node_stack, sppf, sigma_end_to_call, sigma_leo_items)
         return sppf
 
+# memory maps the file at path as read only bytes, the parsers accept the result in place of a
+# string and lex it without copying (see Lexer.input_buffer)
+def map_input_file(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
 def print_help(val, level):
     if level == 0:
         print(f" {val}")
@@ -1112,7 +1478,7 @@ if __name__ == "__main__":
     }
     
     # test_gfg = GFG(ExprLexer())
-    test_gfg = GFG(ABLexer(), use_pydot=True)
+    test_gfg = GFG(ABLexer())
 
     # simple expression grammar used in gfg paper examples
     # productions = {
@@ -1155,8 +1521,7 @@ if __name__ == "__main__":
     test_gfg.build_gfg(productions, "S")
 
     # must have graphvis installed for this to work
-    if test_gfg.use_pydot:
-        test_gfg.graph.write_png("output.png")
+    test_gfg.write_png("output.png")
 
     #data = "7 + 8 + 9"
     # print(f"is {data} in language: {test_gfg.recognize_string(data)}")
@@ -1165,7 +1530,7 @@ if __name__ == "__main__":
 
 
     # sppf = test_gfg.parse_all_trees(data)
-    # sppf.graph.write_png("sppf.png")
+    # sppf.write_png("sppf.png", test_gfg)
 
     # data = "(7+9"
     # print(f"is {data} in language: {test_gfg.recognize_string(data)}")
@@ -1176,9 +1541,9 @@ if __name__ == "__main__":
     # print_tree(test_gfg.parse_string(data))
 
     # sppf = test_gfg.parse_all_trees(data)
-    # sppf.graph.write_png("sppf.png")
+    # sppf.write_png("sppf.png", test_gfg)
     ret = test_gfg.parse_top_down(data)
-    ret.graph.write_png("sppf.png")
+    ret.write_png("sppf.png", test_gfg)
     #f_sppf = test_gfg.sppf_forward_inference(data)
     #f_sppf = test_gfg.sppf_forward(data)
     #f_sppf.graph.write_png("sppf_forward.png")
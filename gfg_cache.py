@@ -0,0 +1,152 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from array import array
+
+from ply import lex
+from gfg import GFG
+from compiled_gfg import CompiledGFG
+
+# on disk cache of built grammars, a cache file holds everything the parsers read at parse time
+# (the CompiledGFG arrays, the production maps and the lexer master regexes) so a later process
+# can skip lex.lex and build_gfg for a grammar it has seen before
+#
+# file layout:
+#   magic, format version, metadata length
+#   metadata as utf-8 json, padded to a multiple of 4 bytes
+#   the compiled arrays back to back as native ints, in COMPILED_ARRAYS order
+# the arrays are memory mapped and read in place as memoryviews instead of being copied
+
+CACHE_MAGIC = b"GFGC"
+CACHE_VERSION = 1
+HEADER = struct.Struct("<4sII")
+
+# CompiledGFG fields stored in the cache file
+COMPILED_ARRAYS = (
+    "kind",
+    "edge_offsets",
+    "edge_targets",
+    "edge_terms",
+    "scan_term",
+    "scan_target",
+    "term_scan_offsets",
+    "term_scan_nodes",
+    "call_target",
+    "exit_to_end",
+    "pred",
+    "pred_term",
+    "call_to_return",
+    "return_to_call",
+    "start_to_end",
+    "end_to_start",
+)
+
+# GFG maps stored in the cache file, int -> int maps are stored as lists of pairs
+GFG_MAPS = (
+    "map_prod_name_to_start",
+    "map_start_to_prod_name",
+    "map_start_to_end",
+    "map_end_to_start",
+    "map_call_to_return",
+    "map_return_to_call",
+)
+
+# module dictionary of a lexer object as lex.lex sees it
+def lexer_dict(lexer):
+    return {name: getattr(lexer, name) for name in dir(lexer)}
+
+# hex digest identifying a grammar, its start production and its lexer
+def grammar_key(productions, start_prod, lexer):
+    key = {
+        "version": CACHE_VERSION,
+        "start": start_prod,
+        "productions": productions,
+        "lexer": lex.lextab_signature(lexer_dict(lexer), int(re.VERBOSE)),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+def save_gfg(path, gfg):
+    compiled = gfg.compiled
+    meta = {
+        "num_nodes": compiled.num_nodes,
+        "terminals": compiled.terminals,
+        "productions": gfg.productions,
+        "start_prod": gfg.start_prod,
+        "nullable_prods": sorted(gfg.nullable_prods),
+        "maps": {name: list(getattr(gfg, name).items()) for name in GFG_MAPS},
+        "arrays": [len(getattr(compiled, name)) for name in COMPILED_ARRAYS],
+        "itemsize": array('i').itemsize,
+        "lexer": gfg.lexer.lexer.tables(),
+    }
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    meta_bytes += b" " * (-len(meta_bytes) % 4)
+
+    # written next to the final file and renamed so readers never see a partial cache file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(meta_bytes)))
+        f.write(meta_bytes)
+        for name in COMPILED_ARRAYS:
+            f.write(getattr(compiled, name).tobytes())
+    os.replace(tmp_path, path)
+
+# returns the GFG stored at path for lexer, or None if the file is missing or unusable
+def load_gfg(path, lexer, worklist="list"):
+    try:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    # a damaged file is rebuilt by cached_gfg like a missing one
+    try:
+        magic, version, meta_len = HEADER.unpack_from(buf, 0)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            return None
+        meta = json.loads(bytes(buf[HEADER.size:HEADER.size + meta_len]))
+        itemsize = meta["itemsize"]
+        if itemsize != array('i').itemsize or len(meta["arrays"]) != len(COMPILED_ARRAYS):
+            return None
+        if HEADER.size + meta_len + sum(meta["arrays"]) * itemsize != len(buf):
+            return None
+
+        gfg = GFG(lexer, worklist=worklist, build_lexer=False)
+        # rebuilt from the stored master regexes without lex.lex reflection and validation
+        lexer.lexer = lex.Lexer()
+        lexer.lexer.load_tables(meta["lexer"], lexer_dict(lexer))
+
+        gfg.productions = meta["productions"]
+        gfg.start_prod = meta["start_prod"]
+        gfg.nullable_prods = set(meta["nullable_prods"])
+        for name, pairs in meta["maps"].items():
+            setattr(gfg, name, dict(pairs))
+
+        compiled = CompiledGFG(meta["num_nodes"], meta["terminals"])
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+
+    view = memoryview(buf)
+    offset = HEADER.size + meta_len
+    for name, length in zip(COMPILED_ARRAYS, meta["arrays"]):
+        nbytes = length * itemsize
+        setattr(compiled, name, view[offset:offset + nbytes].cast("i"))
+        offset += nbytes
+    gfg.compiled = compiled
+    return gfg
+
+# returns a built GFG for productions, loading it from cache_dir when the same grammar and lexer
+# were cached before and building and caching it otherwise
+def cached_gfg(lexer, productions, start_prod="S", cache_dir="gfg_cache", worklist="list"):
+    path = os.path.join(cache_dir, grammar_key(productions, start_prod, lexer) + ".gfgc")
+    gfg = load_gfg(path, lexer, worklist)
+    if gfg is not None:
+        return gfg
+
+    gfg = GFG(lexer, worklist=worklist)
+    gfg.build_gfg(productions, start_prod)
+    os.makedirs(cache_dir, exist_ok=True)
+    save_gfg(path, gfg)
+    return gfg
@@ -0,0 +1,490 @@
+from sppf import Sppf, CompactSppf
+
+# incremental top down parser over a gfg for inputs that are edited and parsed again, like the
+# document of an editor. the per position state of the last parse (see GFG.new_sigma_buffers) is
+# kept along with its terminal ids and forest
+#
+# positions are named by ids that do not change when tokens are inserted or deleted before them:
+# the buffers are indexed by position id, tags are position ids and the forest nodes span
+# (label, start id, end id). position_ids maps the token index of each position to its id and
+# previous maps each id to the id of the position before it. a parse numbers its positions 0 to n
+# and the positions an edit computes get new ids at the end of the buffers, so an edit only
+# touches the positions and forest nodes around it and the rest of the document is not rewritten
+#
+# an edit replaces deleted tokens at offset with inserted tokens. the positions before offset do
+# not depend on the edit and are kept. the positions from offset on are recomputed until one of
+# them is the same as the old position it was shifted to, from there on the old positions are
+# used as they are
+#
+# later positions only read a position through its scan items, when they are scanned, and its
+# sigma_end_to_call map, when a production called there completes. a recomputed position is the
+# same as an old one when its sigma_end_to_call map is the old one with its own id replaced by
+# the old id. with gfg.leo on, completing a production called from a deterministic chain only
+# adds the top of the chain (see GFG.leo_top), so callers that differ are still the same when
+# their chains have the same top, which lets an edit in a right recursive list resume right
+# after it. a recomputed position that is the same takes the old id, so the old positions after
+# it still refer to it. the parse resumes at the first position after the edit that is the same
+# as the old position shift before it and whose scan items are the old ones
+#
+# the forest is updated in place. the children of a node are read from the position it ends at
+# and the leo chains expanded there (see GFG.expand_leo_items), so only the nodes that end at a
+# recomputed position or read a chain link through one are expanded again. every node counts the
+# families (or parents) holding it and is removed once none do
+class IncrementalParser:
+    def __init__(self, gfg, compact_sppf=False):
+        self.gfg = gfg
+        self.compact_sppf = compact_sppf
+
+        self.term_ids = []
+        # only the last sigma set is kept, like parse_top_down
+        self.buffers = gfg.new_sigma_buffers()
+        # id of the position before each token and at the end, see the top of the file
+        self.position_ids = []
+        # id -> id of the position before it, None for position 0 and removed positions
+        self.previous = []
+        # forest of the last parse, False if the input was not in the language
+        self.sppf = False
+        # number of positions closed by the last parse or edit
+        self.recomputed = 0
+
+        # root of the forest, position id -> the expanded nodes that end there and node -> number
+        # of families holding it
+        self.root = None
+        self.node_index = {}
+        self.ref_counts = {}
+        # leo chain links expanded into each position, position id -> {tag of the completed end
+        # item: [(top, end item, return item, next end item)]}, and tag -> the positions with links
+        # of that tag
+        self.links_at = {}
+        self.link_positions = {}
+        # nodes expanded by the current build_forest
+        self.expanded = []
+
+    def new_sppf(self):
+        return CompactSppf() if self.compact_sppf else Sppf()
+
+    # parses data from scratch, data is anything GFG.input_term_ids reads
+    # returns the sppf, or False if data is not in the language
+    def parse(self, data):
+        self.term_ids = list(self.gfg.input_term_ids(data))
+        self.gfg.fill_sigma_sets(self.buffers, self.term_ids, drop_sigma_sets=True)
+        count = len(self.term_ids) + 1
+        self.recomputed = count
+        self.position_ids = list(range(count))
+        self.previous = [None] + list(range(count - 1))
+        self.links_at = {}
+        self.link_positions = {}
+        self.sppf = self.new_forest()
+        return self.sppf
+
+    # terminal id of a token given as a terminal id, a terminal name or a lexer token
+    def term_id(self, token):
+        if isinstance(token, int):
+            return token
+        return self.gfg.compiled.terminal_id(getattr(token, "type", token))
+
+    # returns the map from position id to token index, to read the spans of the forest nodes as
+    # token positions
+    def position_indexes(self):
+        return {position: index for index, position in enumerate(self.position_ids)}
+
+    # replaces the deleted tokens starting at token offset with inserted (terminal ids, terminal
+    # names or lexer tokens) and parses the edited input again
+    # returns the sppf, or False if the edited input is not in the language
+    def edit(self, offset, deleted, inserted):
+        gfg = self.gfg
+        terms = self.term_ids
+        if offset < 0 or deleted < 0 or offset + deleted > len(terms):
+            raise ValueError(f"edit of {deleted} tokens at {offset} is outside of the {len(terms)} token input")
+
+        inserted = [self.term_id(token) for token in inserted]
+        # tokens replaced by the same terminal (retyping a name) do not change the parse
+        while deleted and inserted and terms[offset] == inserted[0]:
+            offset += 1
+            deleted -= 1
+            del inserted[0]
+        while deleted and inserted and terms[offset + deleted - 1] == inserted[-1]:
+            deleted -= 1
+            inserted.pop()
+        if not deleted and not inserted:
+            self.recomputed = 0
+            return self.sppf
+
+        terms[offset:offset + deleted] = inserted
+        shift = len(inserted) - deleted
+        # first position after the inserted tokens
+        edit_end = offset + len(inserted)
+
+        buffers = self.buffers
+        sigma_sets = buffers[0]
+        old_ids = self.position_ids
+        previous = self.previous
+
+        # ids of the positions from offset on, the old ids that recomputed positions took and
+        # whether position 0, which always has id 0, is not the same as before
+        new_ids = []
+        same_ids = set()
+        zero_changed = False
+        resume = None
+        for k in range(offset, len(terms) + 1):
+            next_term = terms[k] if k < len(terms) else None
+            if k == 0:
+                for buf in buffers:
+                    buf.append(None)
+                previous.append(None)
+                gfg.initial_position(buffers, next_term, len(sigma_sets) - 1)
+            else:
+                previous_id = new_ids[-1] if new_ids else old_ids[k - 1]
+                gfg.next_sigma_set(buffers, terms[k - 1], next_term, drop_sigma_sets=True, previous=previous_id)
+                previous.append(previous_id)
+            position = len(sigma_sets) - 1
+
+            # the old position this one may be the same as
+            old_position = None
+            if k >= edit_end:
+                old_position = old_ids[k - shift]
+            elif k == offset and deleted:
+                # when a token is replaced position offset has only its lookahead changed
+                old_position = old_ids[k]
+            # id 0 is always position 0
+            if (k == 0) != (old_position == 0):
+                old_position = None
+
+            is_same = old_position is not None and self.same_position(position, old_position, zero_changed)
+            if k == 0:
+                zero_changed = not is_same
+                old_position = 0
+            if is_same or k == 0:
+                is_resumed = is_same and k >= edit_end and self.same_scan_items(position, old_position, zero_changed)
+                self.move_position(position, old_position)
+                same_ids.add(old_position)
+                new_ids.append(old_position)
+                if is_resumed:
+                    resume = k
+                    break
+            else:
+                new_ids.append(position)
+        self.recomputed = len(new_ids)
+
+        # the old positions after the resumed one are kept as they are
+        old_end = resume - shift + 1 if resume is not None else len(old_ids)
+        replaced = set(old_ids[offset:old_end])
+        old_ids[offset:old_end] = new_ids
+        if resume is not None and resume < len(terms):
+            sigma_sets[new_ids[-1]] = None
+        removed = replaced - same_ids
+        for position in removed:
+            for buf in buffers:
+                buf[position] = None
+            previous[position] = None
+
+        marked = self.invalidate_links(replaced, removed)
+        if self.sppf is False:
+            self.sppf = self.new_forest()
+        else:
+            self.sppf = self.update_forest(replaced, removed, marked)
+        return self.sppf
+
+    # old id of tag while comparing the recomputed position to old_position, None if tag is not
+    # the same as an old position
+    def old_tag(self, tag, position, old_position, zero_changed):
+        if tag == position:
+            return old_position
+        if tag == 0 and zero_changed:
+            return None
+        return tag
+
+    # maps the items to the old ids, None if one of them has no old id
+    def old_items(self, items, position, old_position, zero_changed):
+        mapped = set()
+        for label, tag in items:
+            old_tag = self.old_tag(tag, position, old_position, zero_changed)
+            if old_tag is None:
+                return None
+            mapped.add((label, old_tag))
+        return mapped
+
+    # checks whether the recomputed position is the same as old_position (see the top of the file)
+    def same_position(self, position, old_position, zero_changed):
+        gfg = self.gfg
+        sigma_end_to_call = self.buffers[3]
+        sigma_leo_tops = self.buffers[6]
+        end_to_call = sigma_end_to_call[position]
+        old_end_to_call = sigma_end_to_call[old_position]
+        if len(end_to_call) != len(old_end_to_call):
+            return False
+
+        for end_label, callers in end_to_call.items():
+            old_callers = old_end_to_call.get(end_label)
+            if old_callers is None:
+                return False
+            if self.old_items(callers, position, old_position, zero_changed) == old_callers:
+                continue
+            # later positions complete a deterministic chain by adding its top
+            if not gfg.leo:
+                return False
+            top = gfg.leo_top(sigma_end_to_call, sigma_leo_tops, end_label, position)
+            old_top = gfg.leo_top(sigma_end_to_call, sigma_leo_tops, end_label, old_position)
+            if top is None or old_top is None or self.old_items([top], position, old_position, zero_changed) != {old_top}:
+                return False
+        return True
+
+    # checks whether the scan items of the recomputed position are those of old_position
+    def same_scan_items(self, position, old_position, zero_changed):
+        scan_sigma_sets = self.buffers[2]
+        scan_items = scan_sigma_sets[position]
+        old_scan_items = scan_sigma_sets[old_position]
+        if len(scan_items) != len(old_scan_items):
+            return False
+        for term, items in scan_items.items():
+            if term not in old_scan_items or self.old_items(items, position, old_position, zero_changed) != set(old_scan_items[term]):
+                return False
+        return True
+
+    # moves the recomputed position, the last one in the buffers, to the id old_position
+    def move_position(self, position, old_position):
+        sigma_sets, call_sigma_sets, scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_tops, sigma_leo_items = self.buffers
+
+        def moved(item):
+            label, tag = item
+            return (label, old_position) if tag == position else item
+
+        def moved_items(items):
+            return {moved(item) for item in items}
+
+        if sigma_sets[position] is not None:
+            sigma_sets[old_position] = moved_items(sigma_sets[position])
+        call_sigma_sets[old_position] = moved_items(call_sigma_sets[position])
+        scan_sigma_sets[old_position] = {term: [moved(item) for item in items]
+                                         for term, items in scan_sigma_sets[position].items()}
+        sigma_end_to_call[old_position] = {end_label: moved_items(callers)
+                                           for end_label, callers in sigma_end_to_call[position].items()}
+        sigma_end_to_exit[old_position] = {moved(end_item): set(exit_labels)
+                                           for end_item, exit_labels in sigma_end_to_exit[position].items()}
+        sigma_return_to_end[old_position] = {moved(return_item): moved_items(end_items)
+                                             for return_item, end_items in sigma_return_to_end[position].items()}
+        sigma_leo_tops[old_position] = {end_label: top if top is None else moved(top)
+                                        for end_label, top in sigma_leo_tops[position].items()}
+        sigma_leo_items[old_position] = {moved(top): moved_items(items)
+                                         for top, items in sigma_leo_items[position].items()}
+        for buf in self.buffers:
+            buf.pop()
+        self.previous[old_position] = self.previous.pop()
+
+    # expands the leo items of top in the position into chain links (see GFG.expand_leo_items) and
+    # records them, adding the nodes that read them to marked if it is given
+    def expand_links(self, position, top, marked=None):
+        sigma_sets, call_sigma_sets, scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_tops, sigma_leo_items = self.buffers
+        links = []
+        self.gfg.expand_leo_items(sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_items, position, top, links)
+
+        position_links = self.links_at.setdefault(position, {})
+        for element, return_elem, next_element in links:
+            tag = element[1]
+            position_links.setdefault(tag, []).append((top, element, return_elem, next_element))
+            self.link_positions.setdefault(tag, set()).add(position)
+            if marked is not None:
+                marked.add((return_elem[0], return_elem[1], position))
+                marked.add((next_element[0], next_element[1], position))
+
+    # undoes the chain links that went through a replaced position and expands the chains again
+    # from there, returns the nodes whose children were read from a changed link
+    def invalidate_links(self, replaced, removed):
+        sigma_end_to_exit, sigma_return_to_end, sigma_leo_items = self.buffers[4], self.buffers[5], self.buffers[7]
+        links_at = self.links_at
+        link_positions = self.link_positions
+
+        # the links in a replaced position went with its old state
+        for position in replaced:
+            for tag in links_at.pop(position, ()):
+                link_positions[tag].discard(position)
+
+        marked = set()
+        expand = set()
+        for tag in replaced:
+            for position in link_positions.pop(tag, ()):
+                for top, element, return_elem, next_element in links_at[position].pop(tag):
+                    ends = sigma_return_to_end[position][return_elem]
+                    ends.discard(element)
+                    if not ends:
+                        sigma_end_to_exit[position][next_element].discard(return_elem[0])
+                    marked.add((return_elem[0], return_elem[1], position))
+                    marked.add((next_element[0], next_element[1], position))
+                    # the chain is expanded again from its first end item that is still there, an
+                    # end item of a removed position is only reached through a link undone here
+                    if tag not in removed:
+                        sigma_leo_items[position].setdefault(top, set()).add(element)
+                        expand.add((position, top))
+
+        for position, top in expand:
+            self.expand_links(position, top, marked)
+        return marked
+
+    # get_sppf hook, expands every node once. the leo chains of a top are expanded into the
+    # position it ends at before the node is
+    def expand_node(self, node_def, sppf):
+        label, start, end = node_def
+        expanded = self.node_index.setdefault(end, set())
+        if node_def in expanded:
+            return True
+        expanded.add(node_def)
+        self.expanded.append(node_def)
+        if (label, start) in self.buffers[7][end]:
+            self.expand_links(end, (label, start))
+        return False
+
+    # expands the nodes in stack and the nodes they reach that are not in sppf yet, and counts the
+    # references to their children
+    def build_forest(self, sppf, stack):
+        sigma_sets, call_sigma_sets, scan_sigma_sets, sigma_end_to_call, sigma_end_to_exit, sigma_return_to_end, sigma_leo_tops, sigma_leo_items = self.buffers
+        self.expanded = []
+        self.gfg.get_sppf(call_sigma_sets, sigma_return_to_end, sigma_end_to_exit, stack, sppf, sigma_end_to_call,
+                          reuse=self.expand_node, sigma_previous=self.previous)
+
+        ref_counts = self.ref_counts
+        for node_def in self.expanded:
+            for child in family_members(sppf, node_def):
+                ref_counts[child] = ref_counts.get(child, 0) + 1
+        self.expanded = []
+
+    # builds the forest of the current positions from scratch, False if the input is not in the
+    # language
+    def new_forest(self):
+        self.node_index = {}
+        self.ref_counts = {}
+        root = (1, 0, self.position_ids[-1])
+        if (1, 0) not in self.buffers[0][root[2]]:
+            self.root = None
+            return False
+
+        sppf = self.new_sppf()
+        sppf.add_node(root, "symbol")
+        self.root = root
+        self.ref_counts[root] = 1
+        self.build_forest(sppf, [root])
+        return sppf
+
+    # updates the forest after the replaced positions were recomputed, marked are the nodes that
+    # read a changed chain link. returns the forest, or False if the input is not in the language
+    def update_forest(self, replaced, removed, marked):
+        sppf = self.sppf
+        node_index = self.node_index
+        ref_counts = self.ref_counts
+
+        root = (1, 0, self.position_ids[-1])
+        if (1, 0) not in self.buffers[0][root[2]]:
+            self.root = None
+            self.node_index = {}
+            self.ref_counts = {}
+            return False
+
+        # nodes whose children may have changed
+        changed = set()
+        for position in replaced:
+            changed.update(node_index.pop(position, ()))
+        for node_def in marked:
+            expanded = node_index.get(node_def[2])
+            if expanded is not None and node_def in expanded:
+                expanded.discard(node_def)
+                changed.add(node_def)
+
+        unreferenced = []
+        suspects = set()
+        for node_def in changed:
+            self.release_children(sppf, node_def, unreferenced, suspects)
+
+        stack = []
+        if root != self.root:
+            ref_counts[self.root] -= 1
+            if ref_counts[self.root] == 0:
+                unreferenced.append(self.root)
+            ref_counts[root] = ref_counts.get(root, 0) + 1
+            self.root = root
+            if root not in sppf.nodes:
+                sppf.add_node(root, "symbol")
+                stack.append(root)
+
+        # changed nodes that are still held are expanded again, the others only if a new family
+        # reaches them
+        for node_def in changed:
+            if node_def[2] in removed or not ref_counts.get(node_def):
+                sppf.remove_node(node_def)
+                ref_counts.pop(node_def, None)
+            else:
+                stack.append(node_def)
+        self.build_forest(sppf, stack)
+
+        # the nodes no longer held, unless a new family holds them again, and then the nodes only
+        # held by a cycle of nullable derivations, which are found once the others are removed
+        unreferenced = {node_def for node_def in unreferenced if ref_counts.get(node_def) == 0}
+        while unreferenced or suspects:
+            self.remove_nodes(sppf, unreferenced, suspects)
+            unreferenced = self.unheld_cycles(sppf, suspects)
+        return sppf
+
+    # drops the references of the children of node_def, appending the children that are no longer
+    # held to unreferenced and adding the others to suspects
+    def release_children(self, sppf, node_def, unreferenced, suspects):
+        ref_counts = self.ref_counts
+        for child in sppf.clear_children(node_def):
+            count = ref_counts.get(child)
+            if count is None:
+                # removed along with node_def
+                continue
+            ref_counts[child] = count - 1
+            if count == 1:
+                unreferenced.append(child)
+            else:
+                suspects.add(child)
+
+    # removes the nodes that are not held and the nodes only they held
+    def remove_nodes(self, sppf, node_defs, suspects):
+        ref_counts = self.ref_counts
+        node_index = self.node_index
+        while node_defs:
+            for node_def in node_defs:
+                del ref_counts[node_def]
+                expanded = node_index.get(node_def[2])
+                if expanded is not None:
+                    expanded.discard(node_def)
+            unreferenced = []
+            for node_def in node_defs:
+                self.release_children(sppf, node_def, unreferenced, suspects)
+                sppf.remove_node(node_def)
+            node_defs = unreferenced
+
+    # returns the nodes held only by nodes of their own span that are not held from outside it.
+    # a cycle in the forest goes through nullable derivations, so its nodes all have the same
+    # span and only the spans of the suspects, whose count dropped, need to be looked at
+    def unheld_cycles(self, sppf, suspects):
+        ref_counts = self.ref_counts
+        spans = {(node_def[1], node_def[2]) for node_def in suspects if node_def in ref_counts}
+        suspects.clear()
+
+        unheld = []
+        for start, end in spans:
+            group = [node_def for node_def in self.node_index.get(end, ()) if node_def[1] == start]
+            held = {}
+            for node_def in group:
+                held.setdefault(node_def, ref_counts[node_def])
+                for child in family_members(sppf, node_def):
+                    if child[1:] == (start, end):
+                        held[child] = held.get(child, ref_counts[child]) - 1
+
+            stack = [node_def for node_def in group if held[node_def] > 0]
+            alive = set(stack)
+            while stack:
+                for child in family_members(sppf, stack.pop()):
+                    if child[1:] == (start, end) and child not in alive:
+                        alive.add(child)
+                        stack.append(child)
+            unheld.extend(node_def for node_def in group if node_def not in alive)
+        return unheld
+
+# children of node_def with each packed node replaced by its two children
+def family_members(sppf, node_def):
+    for child in sppf.children(node_def):
+        if isinstance(child, int):
+            yield from sppf.children(child)
+        else:
+            yield child
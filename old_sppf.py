@@ -1,4 +1,4 @@
-import pydot
+# pydot is only imported when use_dot builds a graph, like sppf.forest_to_dot
 
 class SppfNode_Old:
     def __init__(self, node_def, long_name, type):
@@ -35,10 +35,12 @@ class Sppf_Old:
         self.use_dot = use_dot
         self.nodes = {}
         if self.use_dot:
+            import pydot
             self.graph = pydot.Dot("sppf_graph", graph_type="digraph", bgcolor="white")
         
     def rebuild_with_root(self, root_node):
         if self.use_dot:
+            import pydot
             self.graph = pydot.Dot("sppf_graph", graph_type="digraph", bgcolor="white")
         root = self.nodes[root_node]
         self.rebuild_node(root)
@@ -49,6 +51,7 @@ class Sppf_Old:
 
         node.rebuilt = True
         if self.use_dot:
+            import pydot
             if node.type == "packed":
                 self.graph.add_node(pydot.Node(node.get_pydot_label(), label="", shape="circle"))
             else:
@@ -57,6 +60,7 @@ class Sppf_Old:
         for dst,_ in node.outgoing_edges.items():
             self.rebuild_node(self.nodes[dst])
             if self.use_dot:
+                import pydot
                 self.graph.add_edge(pydot.Edge(node.get_pydot_label(), self.nodes[dst].get_pydot_label()))
             
 
@@ -65,6 +69,7 @@ class Sppf_Old:
             node = SppfNode_Old(node_def, long_name, type)
             self.nodes[node_def] = node
             if self.use_dot:
+                import pydot
                 if type == "packed":
                     self.graph.add_node(pydot.Node(node.get_pydot_label(), label="", shape="circle"))
                 else :
@@ -83,6 +88,7 @@ class Sppf_Old:
             # optional edges in pydot for gfs visualization, scan edges are black, 
             # epsilon edges are red
             if self.use_dot:
+                import pydot
                 self.graph.add_edge(pydot.Edge(src_node.get_pydot_label(), dest_node.get_pydot_label()))
             # print(f"\t\t\tcreating edge from {src.long_name} to {dest.long_name} with LABEL: {label}")
 
@@ -0,0 +1,81 @@
+import multiprocessing
+import tempfile
+from functools import partial
+from itertools import islice
+
+from gfg import GFG
+from gfg_cache import cached_gfg
+from sppf_binary import sppf_bytes, SppfView
+
+# process pool front end for GFG.parse_batch, the inputs are split into chunks that are parsed
+# by worker processes and the results are yielded in input order
+#
+# each worker holds one GFG for the whole run. with the fork start method the workers inherit
+# the GFG built in the parent, with spawn (or when cache_dir is given) each worker loads the grammar
+# from the grammar cache, whose compiled arrays are memory mapped and so shared between workers.
+# spawn without a cache_dir uses a temporary cache that is removed when the run ends
+
+# GFG used by parse_chunk in this process
+worker_gfg = None
+
+def build_gfg(lexer_class, productions, start_prod, cache_dir, worklist):
+    if cache_dir:
+        return cached_gfg(lexer_class(), productions, start_prod, cache_dir=cache_dir, worklist=worklist)
+    gfg = GFG(lexer_class(), worklist=worklist)
+    gfg.build_gfg(productions, start_prod)
+    return gfg
+
+def init_worker(lexer_class, productions, start_prod, cache_dir, worklist):
+    global worker_gfg
+    if worker_gfg is None or cache_dir:
+        worker_gfg = build_gfg(lexer_class, productions, start_prod, cache_dir, worklist)
+
+def parse_chunk(chunk, mode, kwargs, binary_sppf=False):
+    results = list(worker_gfg.parse_batch(chunk, mode, **kwargs))
+    if binary_sppf:
+        results = [result if result is False else sppf_bytes(result) for result in results]
+    return results
+
+def chunked(inputs, chunksize):
+    inputs = iter(inputs)
+    while True:
+        chunk = list(islice(inputs, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+# parses every string of inputs with processes workers (all cores by default), yielding the
+# result of each in input order. mode and kwargs are passed to GFG.parse_batch, recognize mode
+# returns booleans and the sppf modes return the forests pickled back from the workers, or sent in
+# the binary sppf format and read as SppfViews when binary_sppf is set
+def parse_parallel(lexer_class, productions, inputs, start_prod="S", mode="recognize", processes=None,
+                   chunksize=256, cache_dir=None, worklist="list", start_method=None, binary_sppf=False, **kwargs):
+    global worker_gfg
+
+    context = multiprocessing.get_context(start_method)
+    # spawned workers load the grammar from a cache, a temporary one unless cache_dir is given
+    temp_cache = None
+    if context.get_start_method() != "fork" and not cache_dir:
+        temp_cache = tempfile.TemporaryDirectory()
+        cache_dir = temp_cache.name
+
+    try:
+        if context.get_start_method() == "fork" and not cache_dir:
+            # built once here and inherited by every worker
+            worker_gfg = build_gfg(lexer_class, productions, start_prod, cache_dir, worklist)
+        elif cache_dir:
+            # fill the cache so the workers only ever load it
+            build_gfg(lexer_class, productions, start_prod, cache_dir, worklist)
+
+        init_args = (lexer_class, productions, start_prod, cache_dir, worklist)
+        with context.Pool(processes, initializer=init_worker, initargs=init_args) as pool:
+            parse = partial(parse_chunk, mode=mode, kwargs=kwargs, binary_sppf=binary_sppf)
+            for results in pool.imap(parse, chunked(inputs, chunksize)):
+                if binary_sppf:
+                    results = [result if result is False else SppfView(result) for result in results]
+                yield from results
+    finally:
+        # the workers are gone, do not keep the grammar alive in this process
+        worker_gfg = None
+        if temp_cache is not None:
+            temp_cache.cleanup()
@@ -16,7 +16,8 @@ parent = os.path.dirname(current)
 # the sys.path.
 sys.path.append(parent)
 
-from gfg import GFG
+from gfg import GFG, map_input_file
+from gfg_cache import cached_gfg
 from ab_lexer import ABLexer
 
 grammars = {
@@ -34,18 +35,34 @@ lexers = {
 
 # @profile
 def main(input_string, grammar, lexer, args):
+    # lex outside of the timed region so only parsing is measured
+    if args.pretokenize:
+        lexer.build()
+        input_string = lexer.tokenize_to_array(input_string)
+
     start_time = time.time()
     
-    gfg = GFG(lexer, use_pydot=False)
-    gfg.build_gfg(grammar, "S")
+    if args.cache_dir:
+        gfg = cached_gfg(lexer, grammar, "S", cache_dir=args.cache_dir, worklist=args.worklist)
+    elif args.lextab:
+        lexer.build(lextab=args.lextab)
+        gfg = GFG(lexer, worklist=args.worklist, build_lexer=False)
+        gfg.build_gfg(grammar, "S")
+    else:
+        gfg = GFG(lexer, worklist=args.worklist)
+        gfg.build_gfg(grammar, "S")
+    gfg.prediction_filter = not args.no_prediction_filter
+    gfg.leo = not args.no_leo
 
     if args.single:
         gfg.parse_string(input_string)
     elif args.topdown:
-        res = gfg.parse_top_down(input_string)
+        res = gfg.parse_top_down(input_string, compact_sppf=args.compact_sppf)
         del res
     elif args.bottomup:
-        gfg.sppf_forward_inference(input_string)
+        gfg.sppf_forward_inference(input_string, compact_sppf=args.compact_sppf)
+    elif args.recognize:
+        gfg.recognize_string(input_string, sigma_backend=args.sigma_backend, release_dead_sets=args.release_dead_sets)
 
     end_time = time.time()
 
@@ -62,10 +79,23 @@ if __name__ == "__main__":
     group.add_argument('--single', action='store_true', help='Process using single method')
     group.add_argument('--topdown', action='store_true', help='Process using top-down method')
     group.add_argument('--bottomup', action='store_true', help='Process using bottom-up method')
+    group.add_argument('--recognize', action='store_true', help='Only recognize the input')
 
     parser.add_argument('--grammar', type=str, default="b_grammar", help='grammar to use')
-    parser.add_argument('--input', type=str, required=True, help='input string to parse')
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument('--input', type=str, help='input string to parse')
+    input_group.add_argument('--input-file', type=str, help='file to parse, memory mapped and lexed in place')
+    parser.add_argument('--sigma-backend', type=str, default="set", choices=["set", "bitset"], help='sigma set representation used by --recognize')
+    parser.add_argument('--compact-sppf', action='store_true', help='build the sppf in the compact integer array backend')
+    parser.add_argument('--worklist', type=str, default="list", choices=["list", "queue"], help='eclosuer work queue implementation')
+    parser.add_argument('--cache-dir', type=str, default=None, help='load the built grammar from (or save it to) this grammar cache directory')
+    parser.add_argument('--lextab', type=str, default=None, help='load the lexer tables from (or save them to) this file')
+    parser.add_argument('--pretokenize', action='store_true', help='tokenize the input to a terminal id array before timing the parse')
+    parser.add_argument('--no-prediction-filter', action='store_true', help='predict every production like the paper instead of only those the next token can start')
+    parser.add_argument('--no-leo', action='store_true', help='complete right recursive chains item by item instead of in one step')
+    parser.add_argument('--release-dead-sets', action='store_true', help='release sigma sets no live item refers to during --recognize')
 
     args = parser.parse_args()
 
-    main(args.input, grammars[args.grammar], lexers[args.grammar], args)
+    input_data = map_input_file(args.input_file) if args.input_file else args.input
+    main(input_data, grammars[args.grammar], lexers[args.grammar], args)
@@ -39,6 +39,12 @@ import types
 import copy
 import os
 import inspect
+import json
+import hashlib
+from array import array
+
+# Version of the lexer table files written by Lexer.writetab()
+__tabversion__ = '1'
 
 # This tuple contains acceptable string types
 StringTypes = (str, bytes)
@@ -58,6 +64,20 @@ class LexToken(object):
     def __repr__(self):
         return f'LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})'
 
+# Token produced when lexing a buffer (see Lexer.input_buffer).  It holds the
+# byte offsets lexpos and lexend into the buffer and only decodes its value
+# when the value is read.
+class BufferToken(LexToken):
+    @property
+    def value(self):
+        if '_value' in self.__dict__:
+            return self._value
+        return bytes(self.lexdata[self.lexpos:self.lexend]).decode('utf-8', 'replace')
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
 # This object is a stand-in for a logging object created by the
 # logging module.
 
@@ -108,6 +128,9 @@ class Lexer:
         self.lexstateerrorf = {}      # Dictionary of error functions for each state
         self.lexstateeoff = {}        # Dictionary of eof functions for each state
         self.lexreflags = 0           # Optional re compile flags
+        self.lexbuffer = False        # True if lexdata is a bytes-like buffer
+        self.lexbytesre = {}          # Master regexs of each state compiled for bytes
+        self.lexfastre = {}           # tokenize_all() patterns by (state, lexbuffer)
         self.lexdata = None           # Actual input data (as a string)
         self.lexpos = 0               # Current position in input text
         self.lexlen = 0               # Length of the input text
@@ -140,20 +163,130 @@ class Lexer:
                 newre.append((cre, newfindex))
                 newtab[key] = newre
             c.lexstatere = newtab
+            c.lexbytesre = {}
+            c.lexfastre = {}
             c.lexstateerrorf = {}
             for key, ef in self.lexstateerrorf.items():
                 c.lexstateerrorf[key] = getattr(object, ef.__name__)
             c.lexmodule = object
         return c
 
+    # ------------------------------------------------------------
+    # tables() - The master regular expressions and state information
+    # of a built lexer as plain data.  Rule functions are stored by name
+    # ------------------------------------------------------------
+    def tables(self):
+        def funcname(f):
+            return f.__name__ if f else None
+
+        states = {}
+        for state, lexre in self.lexstatere.items():
+            states[state] = []
+            for (_, lexindexfunc), re_text in zip(lexre, self.lexstateretext[state]):
+                findex = [[funcname(entry[0]), entry[1]] if entry else None for entry in lexindexfunc]
+                states[state].append([re_text, findex])
+
+        return {
+            'states': states,
+            'stateinfo': self.lexstateinfo,
+            'ignore': self.lexstateignore,
+            'errorf': {state: funcname(f) for state, f in self.lexstateerrorf.items()},
+            'eoff': {state: funcname(f) for state, f in self.lexstateeoff.items()},
+            'tokens': sorted(self.lextokens),
+            'literals': self.lexliterals,
+            'reflags': self.lexreflags,
+        }
+
+    # ------------------------------------------------------------
+    # load_tables() - Set up the lexer from tables() output.  Rule
+    # functions are looked up by name in fdict
+    # ------------------------------------------------------------
+    def load_tables(self, tables, fdict):
+        def bind(name):
+            return fdict[name] if name else None
+
+        self.lexstatere = {}
+        self.lexstateretext = {}
+        for state, master in tables['states'].items():
+            self.lexstatere[state] = []
+            self.lexstateretext[state] = []
+            for re_text, findex in master:
+                lexindexfunc = [(bind(entry[0]), entry[1]) if entry else None for entry in findex]
+                self.lexstatere[state].append((re.compile(re_text, tables['reflags']), lexindexfunc))
+                self.lexstateretext[state].append(re_text)
+
+        self.lexstateinfo = tables['stateinfo']
+        self.lexstateignore = tables['ignore']
+        self.lexstateerrorf = {state: bind(name) for state, name in tables['errorf'].items()}
+        self.lexstateeoff = {state: bind(name) for state, name in tables['eoff'].items()}
+        self.lextokens = set(tables['tokens'])
+        self.lexliterals = tables['literals']
+        self.lextokens_all = self.lextokens | set(self.lexliterals)
+        self.lexreflags = tables['reflags']
+        self.lexbytesre = {}
+        self.lexfastre = {}
+        self.begin('INITIAL')
+
+    # ------------------------------------------------------------
+    # writetab() - Write the lexer tables to tabfile along with the
+    # signature of the rules they were built from
+    # ------------------------------------------------------------
+    def writetab(self, tabfile, signature):
+        data = {'tabversion': __tabversion__, 'signature': signature, 'tables': self.tables()}
+        # Write next to the final file and rename so readers never see a partial file
+        tmpfile = f'{tabfile}.{os.getpid()}.tmp'
+        with open(tmpfile, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmpfile, tabfile)
+
+    # ------------------------------------------------------------
+    # readtab() - Load the lexer tables from tabfile.  Returns False,
+    # leaving the lexer unchanged, if the file is missing, unreadable,
+    # from another table version or built from other rules
+    # ------------------------------------------------------------
+    def readtab(self, tabfile, fdict, signature):
+        try:
+            with open(tabfile) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('tabversion') != __tabversion__ or data.get('signature') != signature:
+            return False
+        try:
+            self.load_tables(data['tables'], fdict)
+        except (KeyError, TypeError, re.error):
+            return False
+        return True
+
     # ------------------------------------------------------------
     # input() - Push a new string into the lexer
     # ------------------------------------------------------------
     def input(self, s):
+        if not isinstance(s, str):
+            self.input_buffer(s)
+            return
+        self.lexbuffer = False
         self.lexdata = s
         self.lexpos = 0
         self.lexlen = len(s)
 
+    # ------------------------------------------------------------
+    # input_buffer() - Push a bytes-like buffer (bytes, bytearray, mmap)
+    # into the lexer.  The rules are matched as utf-8 directly against
+    # the buffer and token() returns BufferTokens, so the buffer is never
+    # copied or decoded as a whole.  lexpos is a byte offset.
+    # ------------------------------------------------------------
+    def input_buffer(self, buffer):
+        if not self.lexbytesre:
+            reflags = self.lexreflags & ~re.UNICODE
+            for state, lexre in self.lexstatere.items():
+                self.lexbytesre[state] = [(re.compile(re_text.encode('utf-8'), reflags), findex)
+                                          for (_, findex), re_text in zip(lexre, self.lexstateretext[state])]
+        self.lexbuffer = True
+        self.lexdata = buffer
+        self.lexpos = 0
+        self.lexlen = len(buffer)
+
     # ------------------------------------------------------------
     # begin() - Changes the lexing state
     # ------------------------------------------------------------
@@ -200,6 +333,9 @@ class Lexer:
     # you are doing
     # ------------------------------------------------------------
     def token(self):
+        if self.lexbuffer:
+            return self.buffer_token()
+
         # Make local copies of frequently referenced attributes
         lexpos    = self.lexpos
         lexlen    = self.lexlen
@@ -303,6 +439,199 @@ class Lexer:
             raise RuntimeError('No input string given with input()')
         return None
 
+    # ------------------------------------------------------------
+    # buffer_token() - token() for input_buffer().  Same rules as token()
+    # but matches bytes and returns BufferTokens
+    # ------------------------------------------------------------
+    def buffer_token(self):
+        lexpos    = self.lexpos
+        lexlen    = self.lexlen
+        lexignore = self.lexignore.encode('utf-8')
+        lexdata   = self.lexdata
+
+        while lexpos < lexlen:
+            if lexdata[lexpos] in lexignore:
+                lexpos += 1
+                continue
+
+            for lexre, lexindexfunc in self.lexbytesre[self.lexstate]:
+                m = lexre.match(lexdata, lexpos)
+                if not m:
+                    continue
+
+                tok = BufferToken()
+                tok.lexdata = lexdata
+                tok.lineno = self.lineno
+                tok.lexpos = lexpos
+                tok.lexend = m.end()
+
+                i = m.lastindex
+                func, tok.type = lexindexfunc[i]
+
+                if not func:
+                    if tok.type:
+                        self.lexpos = m.end()
+                        return tok
+                    else:
+                        lexpos = m.end()
+                        break
+
+                lexpos = m.end()
+
+                tok.lexer = self
+                self.lexmatch = m
+                self.lexpos = lexpos
+                newtok = func(tok)
+                del tok.lexer
+                del self.lexmatch
+
+                if not newtok:
+                    lexpos    = self.lexpos
+                    lexignore = self.lexignore.encode('utf-8')
+                    break
+                return newtok
+            else:
+                if chr(lexdata[lexpos]) in self.lexliterals:
+                    tok = BufferToken()
+                    tok.lexdata = lexdata
+                    tok.lineno = self.lineno
+                    tok.type = chr(lexdata[lexpos])
+                    tok.lexpos = lexpos
+                    tok.lexend = lexpos + 1
+                    self.lexpos = lexpos + 1
+                    return tok
+
+                if self.lexerrorf:
+                    tok = BufferToken()
+                    tok.lexdata = lexdata
+                    tok.lineno = self.lineno
+                    tok.type = 'error'
+                    tok.lexer = self
+                    tok.lexpos = lexpos
+                    tok.lexend = lexlen
+                    self.lexpos = lexpos
+                    newtok = self.lexerrorf(tok)
+                    if lexpos == self.lexpos:
+                        raise LexError(f"Scanning error. Illegal character {chr(lexdata[lexpos])!r}",
+                                       lexdata[lexpos:])
+                    lexpos = self.lexpos
+                    if not newtok:
+                        continue
+                    return newtok
+
+                self.lexpos = lexpos
+                raise LexError(f"Illegal character {chr(lexdata[lexpos])!r} at index {lexpos}",
+                               lexdata[lexpos:])
+
+        if self.lexeoff:
+            tok = BufferToken()
+            tok.lexdata = lexdata
+            tok.type = 'eof'
+            tok.lineno = self.lineno
+            tok.lexpos = lexpos
+            tok.lexend = lexpos
+            tok.lexer = self
+            self.lexpos = lexpos
+            newtok = self.lexeoff(tok)
+            return newtok
+
+        self.lexpos = lexpos + 1
+        return None
+
+    # ------------------------------------------------------------
+    # tokenize_all() - Tokenize the rest of the input at once.  Returns
+    # the arrays (types, starts, lengths) where types[i] is
+    # token_ids[type] of the i-th token, or only types when types_only
+    # is set.  The tokens are appended straight to the arrays, starts
+    # and lengths are 64 bit since a mapped file can pass 2GB.  While
+    # the current state only has string rules the input is matched with
+    # one finditer() over the master regex.  Function rules, literals
+    # and t_error are left to token(), which handles the next token
+    # whenever the fast path stops.  This reads the whole input, use
+    # token() to stop at the first token a parser cannot take
+    # ------------------------------------------------------------
+    def tokenize_all(self, token_ids, types_only=False):
+        types = array('i')
+        starts = None if types_only else array('q')
+        lengths = None if types_only else array('q')
+        lexdata = self.lexdata
+
+        while True:
+            fastre = self._fast_re()
+            if fastre:
+                pattern, index_types = fastre
+                index_ids = [token_ids[t] if t else None for t in index_types]
+                append_type = types.append
+                lexpos = self.lexpos
+                if types_only:
+                    for m in pattern.finditer(lexdata, lexpos):
+                        # the pattern skips ignored characters itself, anything else between
+                        # tokens is left to token()
+                        if m.start() != lexpos:
+                            break
+                        lexpos = m.end()
+                        token_id = index_ids[m.lastindex]
+                        if token_id is not None:
+                            append_type(token_id)
+                else:
+                    append_start = starts.append
+                    append_length = lengths.append
+                    for m in pattern.finditer(lexdata, lexpos):
+                        if m.start() != lexpos:
+                            break
+                        i = m.lastindex
+                        start = m.start(i)
+                        lexpos = m.end()
+                        token_id = index_ids[i]
+                        if token_id is not None:
+                            append_type(token_id)
+                            append_start(start)
+                            append_length(lexpos - start)
+                self.lexpos = lexpos
+
+            tok = self.token()
+            if not tok:
+                break
+            types.append(token_ids[tok.type])
+            if not types_only:
+                starts.append(tok.lexpos)
+                lengths.append(self.lexpos - tok.lexpos)
+
+        if types_only:
+            return types
+        return types, starts, lengths
+
+    # ------------------------------------------------------------
+    # _fast_re() - The tokenize_all() pattern for the current state and
+    # input type, None if the state has function rules or more than one
+    # master regex.  The pattern is the master regex behind a prefix that
+    # skips ignored characters the way token() does and never gives them
+    # back to a rule.  Returns (pattern, index_types) where index_types
+    # maps group numbers to token types (None for ignored rules)
+    # ------------------------------------------------------------
+    def _fast_re(self):
+        key = (self.lexstate, self.lexbuffer)
+        if key not in self.lexfastre:
+            master = self.lexbytesre[self.lexstate] if self.lexbuffer else self.lexre
+            fastre = None
+            if len(master) == 1 and not any(entry and entry[0] for entry in master[0][1]):
+                lexre, lexindexfunc = master[0]
+                ignore = self.lexignore.encode('utf-8') if self.lexbuffer else self.lexignore
+                if ignore:
+                    prefix = '(?=(?P<lexignored>[%s]*))(?P=lexignored)'
+                    prefix = prefix.encode('utf-8') % re.escape(ignore) if self.lexbuffer else prefix % re.escape(ignore)
+                    pattern = re.compile(prefix + (b'(?:%s)' if self.lexbuffer else '(?:%s)') % lexre.pattern, lexre.flags)
+                else:
+                    pattern = lexre
+                index_types = [None] * (pattern.groups + 1)
+                for name, i in pattern.groupindex.items():
+                    if name in lexre.groupindex:
+                        entry = lexindexfunc[lexre.groupindex[name]]
+                        index_types[i] = entry[1] if entry else None
+                fastre = (pattern, index_types)
+            self.lexfastre[key] = fastre
+        return self.lexfastre[key]
+
     # Iterator interface
     def __iter__(self):
         return self
@@ -709,13 +1038,36 @@ class LexerReflect(object):
                     self.error = True
             linen += 1
 
+# -----------------------------------------------------------------------------
+# lextab_signature(ldict, reflags)
+#
+# Returns a digest of everything in the module dictionary that changes the
+# tables lex() builds: the token list, literals, states and every t_ rule
+# (for functions their regex and line number, which fixes their order).
+# -----------------------------------------------------------------------------
+def lextab_signature(ldict, reflags):
+    parts = [__tabversion__, repr(reflags)]
+    for name in sorted(ldict):
+        if not (name.startswith('t_') or name in ('tokens', 'literals', 'states')):
+            continue
+        value = ldict[name]
+        if isinstance(value, (types.FunctionType, types.MethodType)):
+            value = ('function', _get_regex(value), value.__code__.co_firstlineno)
+        parts.append(f'{name}={value!r}')
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
 # -----------------------------------------------------------------------------
 # lex(module)
 #
 # Build all of the regular expression rules from definitions in the supplied module
+#
+# If lextab is a file path the tables are loaded from it when it was written
+# for the same rules (see lextab_signature), skipping reflection and
+# validation.  Otherwise the lexer is built as usual and its tables are
+# written to lextab for the next run.
 # -----------------------------------------------------------------------------
 def lex(*, module=None, object=None, debug=False, 
-        reflags=int(re.VERBOSE), debuglog=None, errorlog=None):
+        reflags=int(re.VERBOSE), debuglog=None, errorlog=None, lextab=None):
 
     global lexer
 
@@ -745,6 +1097,17 @@ def lex(*, module=None, object=None, debug=False,
     else:
         ldict = get_caller_module_dict(2)
 
+    if lextab:
+        signature = lextab_signature(ldict, reflags)
+        # Loaded into a separate lexer so a failed load leaves nothing behind
+        tablexer = Lexer()
+        if tablexer.readtab(lextab, ldict, signature):
+            lexobj = tablexer
+            token = lexobj.token
+            input = lexobj.input
+            lexer = lexobj
+            return lexobj
+
     # Collect parser information from the dictionary
     linfo = LexerReflect(ldict, log=errorlog, reflags=reflags)
     linfo.get_all()
@@ -845,6 +1208,12 @@ def lex(*, module=None, object=None, debug=False,
             if s not in linfo.ignore:
                 linfo.ignore[s] = linfo.ignore.get('INITIAL', '')
 
+    if lextab:
+        try:
+            lexobj.writetab(lextab, signature)
+        except OSError as e:
+            errorlog.warning("Couldn't write lextab %r. %s", lextab, e)
+
     # Create global versions of the token() and input() functions
     token = lexobj.token
     input = lexobj.input
@@ -64,7 +64,16 @@
 import re
 import types
 import sys
+import os
 import inspect
+import json
+import mmap
+import struct
+import hashlib
+from array import array
+
+# Version of the parse table files written by write_parsetab()
+__tabversion__ = '1'
 
 #-----------------------------------------------------------------------------
 #                     === User configurable parameters ===
@@ -218,6 +227,61 @@ class YaccProduction:
     def error(self):
         raise SyntaxError
 
+# -----------------------------------------------------------------------------
+# class CompiledTables:
+#
+# The action and goto tables of an LRParser with grammar symbols interned to
+# ints.  Each table is a dense list of rows indexed by symbol id, holding None
+# where the table has no entry.  Symbol names missing from the grammar are
+# given the id nsyms, which is None in every row.
+#
+#       symbol_ids    - Grammar symbol name -> id
+#       action_rows   - Action table rows (shift > 0, reduce < 0, accept 0)
+#       goto_rows     - Goto table rows
+#       prod_name     - Name of the left side of each production
+#       prod_lhs      - Symbol id of the left side of each production
+#       prod_len      - Length of each production
+#       prod_func     - Callable of each production, None to reduce without
+#                       calling a rule function
+# -----------------------------------------------------------------------------
+
+class CompiledTables(object):
+    def __init__(self, action, goto, productions, actions=True):
+        self.symbol_ids = {}
+        for table in (action, goto):
+            for state in range(len(table)):
+                for sym in table[state]:
+                    if sym not in self.symbol_ids:
+                        self.symbol_ids[sym] = len(self.symbol_ids)
+        for p in productions:
+            if p.name not in self.symbol_ids:
+                self.symbol_ids[p.name] = len(self.symbol_ids)
+        self.nsyms = len(self.symbol_ids)
+
+        self.action_rows = self.dense_rows(action)
+        self.goto_rows = self.dense_rows(goto)
+
+        self.prod_name = [p.name for p in productions]
+        self.prod_lhs = [self.symbol_ids[p.name] for p in productions]
+        self.prod_len = [p.len for p in productions]
+        self.prod_func = [p.callable if actions else None for p in productions]
+
+    def dense_rows(self, table):
+        rows = []
+        for state in range(len(table)):
+            row = [None] * (self.nsyms + 1)
+            for sym, value in table[state].items():
+                row[self.symbol_ids[sym]] = value
+            rows.append(row)
+        return rows
+
+    # Action for symbol name sym in state, None if it is an error
+    def action(self, state, sym):
+        return self.action_rows[state][self.symbol_ids.get(sym, self.nsyms)]
+
+    def goto(self, state, sym):
+        return self.goto_rows[state][self.symbol_ids.get(sym, self.nsyms)]
+
 # -----------------------------------------------------------------------------
 #                               == LRParser ==
 #
@@ -232,6 +296,7 @@ class LRParser:
         self.errorfunc = errorf
         self.set_defaulted_states()
         self.errorok = True
+        self.tables = None
 
     def errok(self):
         self.errorok = True
@@ -253,6 +318,10 @@ class LRParser:
     #
     # See:  http://www.gnu.org/software/bison/manual/html_node/Default-Reductions.html#Default-Reductions
     def set_defaulted_states(self):
+        if isinstance(self.action, TableRows):
+            # Found from the table arrays without decoding every row
+            self.defaulted_states = self.action.defaulted_states()
+            return
         self.defaulted_states = {}
         for state, actions in self.action.items():
             rules = list(actions.values())
@@ -262,6 +331,21 @@ class LRParser:
     def disable_defaulted_states(self):
         self.defaulted_states = {}
 
+    # Compiled table mode.
+    # Interns the grammar symbols and turns the action and goto tables into
+    # dense rows indexed by symbol id (see CompiledTables).  parse() then runs parse_compiled()
+    # unless debug or tracking is on.  If actions is False no rule function is
+    # called: each reduction takes the value of its first symbol (None for an
+    # empty rule), which is enough to recognize input or to build values with
+    # only the rules that need them.  Productions without a bound function are
+    # always reduced this way.
+    def compile_tables(self, actions=True):
+        self.tables = CompiledTables(self.action, self.goto, self.productions, actions)
+        return self.tables
+
+    def drop_compiled_tables(self):
+        self.tables = None
+
     # parse().
     #
     # This is the core parsing engine.  To operate, it requires a lexer object.
@@ -271,6 +355,9 @@ class LRParser:
     # character index.
 
     def parse(self, input=None, lexer=None, debug=False, tracking=False):
+        if self.tables is not None and not debug and not tracking:
+            return self.parse_compiled(input, lexer)
+
         # If debugging has been specified as a flag, turn it into a logging object
         if isinstance(debug, int) and debug:
             debug = PlyLogger(sys.stderr)
@@ -580,6 +667,247 @@ class LRParser:
             # If we'r here, something really bad happened
             raise RuntimeError('yacc: internal parser error!!!\n')
 
+    # parse_compiled().
+    #
+    # parse() over the compiled tables, without debugging or position tracking.
+    # Apart from the table lookups and the reduce path for productions without
+    # a rule function, this is the same engine as parse().  Make sure changes to
+    # parse() get made here as well.
+
+    def parse_compiled(self, input=None, lexer=None):
+        tables = self.tables
+        symbol_ids = tables.symbol_ids               # Symbol name -> id
+        nsyms = tables.nsyms                         # Id of symbols missing from the grammar
+        action_rows = tables.action_rows
+        goto_rows = tables.goto_rows
+        prod_name = tables.prod_name
+        prod_lhs = tables.prod_lhs
+        prod_len = tables.prod_len
+        prod_func = tables.prod_func
+        defaulted_states = self.defaulted_states
+        lookahead = None
+        lookaheadstack = []
+        pslice  = YaccProduction(None)
+        errorcount = 0
+
+        # If no lexer was given, we will try to use the lex module
+        if not lexer:
+            from . import lex
+            lexer = lex.lexer
+
+        # Set up the lexer and parser objects on pslice
+        pslice.lexer = lexer
+        pslice.parser = self
+
+        # If input was supplied, pass to lexer
+        if input is not None:
+            lexer.input(input)
+
+        # Set the token function
+        get_token = self.token = lexer.token
+
+        # Set up the state and symbol stacks
+        statestack = self.statestack = []
+        symstack = self.symstack = []
+        pslice.stack = symstack
+        errtoken   = None
+
+        # The start state is assumed to be (0,$end)
+
+        statestack.append(0)
+        sym = YaccSymbol()
+        sym.type = '$end'
+        symstack.append(sym)
+        state = 0
+        while True:
+            if state not in defaulted_states:
+                if not lookahead:
+                    if not lookaheadstack:
+                        lookahead = get_token()     # Get the next token
+                    else:
+                        lookahead = lookaheadstack.pop()
+                    if not lookahead:
+                        lookahead = YaccSymbol()
+                        lookahead.type = '$end'
+
+                # Check the action table
+                t = action_rows[state][symbol_ids.get(lookahead.type, nsyms)]
+            else:
+                t = defaulted_states[state]
+
+            if t is not None:
+                if t > 0:
+                    # shift a symbol on the stack
+                    statestack.append(t)
+                    state = t
+                    symstack.append(lookahead)
+                    lookahead = None
+
+                    # Decrease error count on successful shift
+                    if errorcount:
+                        errorcount -= 1
+                    continue
+
+                if t < 0:
+                    # reduce a symbol on the stack, emit a production
+                    plen = prod_len[-t]
+                    func = prod_func[-t]
+
+                    sym = YaccSymbol()
+                    sym.type = prod_name[-t]
+
+                    if func is None:
+                        # No rule function, the value is the value of the first symbol
+                        if plen:
+                            sym.value = symstack[-plen].value
+                            del symstack[-plen:]
+                            del statestack[-plen:]
+                        else:
+                            sym.value = None
+                        symstack.append(sym)
+                        state = goto_rows[statestack[-1]][prod_lhs[-t]]
+                        statestack.append(state)
+                        continue
+
+                    sym.value = None
+
+                    if plen:
+                        targ = symstack[-plen-1:]
+                        targ[0] = sym
+                        pslice.slice = targ
+
+                        try:
+                            # Call the grammar rule with our special slice object
+                            del symstack[-plen:]
+                            self.state = state
+                            func(pslice)
+                            del statestack[-plen:]
+                            symstack.append(sym)
+                            state = goto_rows[statestack[-1]][prod_lhs[-t]]
+                            statestack.append(state)
+                        except SyntaxError:
+                            # If an error was set. Enter error recovery state
+                            lookaheadstack.append(lookahead)    # Save the current lookahead token
+                            symstack.extend(targ[1:-1])         # Put the production slice back on the stack
+                            statestack.pop()                    # Pop back one state (before the reduce)
+                            state = statestack[-1]
+                            sym.type = 'error'
+                            sym.value = 'error'
+                            lookahead = sym
+                            errorcount = error_count
+                            self.errorok = False
+
+                        continue
+
+                    else:
+                        targ = [sym]
+                        pslice.slice = targ
+
+                        try:
+                            # Call the grammar rule with our special slice object
+                            self.state = state
+                            func(pslice)
+                            symstack.append(sym)
+                            state = goto_rows[statestack[-1]][prod_lhs[-t]]
+                            statestack.append(state)
+                        except SyntaxError:
+                            # If an error was set. Enter error recovery state
+                            lookaheadstack.append(lookahead)    # Save the current lookahead token
+                            statestack.pop()                    # Pop back one state (before the reduce)
+                            state = statestack[-1]
+                            sym.type = 'error'
+                            sym.value = 'error'
+                            lookahead = sym
+                            errorcount = error_count
+                            self.errorok = False
+
+                        continue
+
+                if t == 0:
+                    n = symstack[-1]
+                    return getattr(n, 'value', None)
+
+            if t is None:
+                # Error recovery, as in parse()
+                if errorcount == 0 or self.errorok:
+                    errorcount = error_count
+                    self.errorok = False
+                    errtoken = lookahead
+                    if errtoken.type == '$end':
+                        errtoken = None               # End of file!
+                    if self.errorfunc:
+                        if errtoken and not hasattr(errtoken, 'lexer'):
+                            errtoken.lexer = lexer
+                        self.state = state
+                        tok = self.errorfunc(errtoken)
+                        if self.errorok:
+                            # User must have done some kind of panic
+                            # mode recovery on their own.  The
+                            # returned token is the next lookahead
+                            lookahead = tok
+                            errtoken = None
+                            continue
+                    else:
+                        if errtoken:
+                            if hasattr(errtoken, 'lineno'):
+                                lineno = lookahead.lineno
+                            else:
+                                lineno = 0
+                            if lineno:
+                                sys.stderr.write('yacc: Syntax error at line %d, token=%s\n' % (lineno, errtoken.type))
+                            else:
+                                sys.stderr.write('yacc: Syntax error, token=%s' % errtoken.type)
+                        else:
+                            sys.stderr.write('yacc: Parse error in input. EOF\n')
+                            return
+
+                else:
+                    errorcount = error_count
+
+                # case 1:  the statestack only has 1 entry on it.
+                if len(statestack) <= 1 and lookahead.type != '$end':
+                    lookahead = None
+                    errtoken = None
+                    state = 0
+                    # Nuke the pushback stack
+                    del lookaheadstack[:]
+                    continue
+
+                # case 2: the statestack has a couple of entries on it, but we're
+                # at the end of the file. nuke the top entry and generate an error token
+                if lookahead.type == '$end':
+                    # Whoa. We're really hosed here. Bail out
+                    return
+
+                if lookahead.type != 'error':
+                    sym = symstack[-1]
+                    if sym.type == 'error':
+                        # Hmmm. Error is on top of stack, we'll just nuke input
+                        # symbol and continue
+                        lookahead = None
+                        continue
+
+                    # Create the error symbol for the first time and make it the new lookahead symbol
+                    t = YaccSymbol()
+                    t.type = 'error'
+
+                    if hasattr(lookahead, 'lineno'):
+                        t.lineno = t.endlineno = lookahead.lineno
+                    if hasattr(lookahead, 'lexpos'):
+                        t.lexpos = t.endlexpos = lookahead.lexpos
+                    t.value = lookahead
+                    lookaheadstack.append(lookahead)
+                    lookahead = t
+                else:
+                    sym = symstack.pop()
+                    statestack.pop()
+                    state = statestack[-1]
+
+                continue
+
+            # If we'r here, something really bad happened
+            raise RuntimeError('yacc: internal parser error!!!\n')
+
 # -----------------------------------------------------------------------------
 #                          === Grammar Representation ===
 #
@@ -682,6 +1010,34 @@ class Production(object):
         if self.func:
             self.callable = pdict[self.func]
 
+# -----------------------------------------------------------------------------
+# class MiniProduction:
+#
+# The parts of a Production the LR parsing engine uses.  Productions of parse
+# tables read from a parsetab file are MiniProductions.
+# -----------------------------------------------------------------------------
+
+class MiniProduction(object):
+    def __init__(self, str, name, len, func, file, line):
+        self.name     = name
+        self.len      = len
+        self.func     = func
+        self.callable = None
+        self.file     = file
+        self.line     = line
+        self.str      = str
+
+    def __str__(self):
+        return self.str
+
+    def __repr__(self):
+        return 'MiniProduction(%s)' % self.str
+
+    # Bind the production function name to a callable
+    def bind(self, pdict):
+        if self.func:
+            self.callable = pdict[self.func]
+
 # -----------------------------------------------------------------------------
 # class LRItem
 #
@@ -779,6 +1135,14 @@ class Grammar(object):
 
         self.Follow       = {}      # A dictionary of precomputed FOLLOW(x) symbols
 
+        self.FirstBits    = {}      # FIRST(x) of every symbol and FOLLOW(x) of every
+        self.FollowBits   = {}      # nonterminal as int bitsets.  Bit i stands for
+                                    # BitSymbols[i]
+
+        self.BitSymbols   = []      # The terminals, '$end' and '<empty>' in bit order
+
+        self.BitIds       = {}      # Maps the symbols of BitSymbols to their bit number
+
         self.Precedence   = {}      # Precedence rules for each terminal. Contains tuples of the
                                     # form ('right',level) or ('nonassoc', level) or ('left',level)
 
@@ -1073,75 +1437,100 @@ class Grammar(object):
         return unused
 
     # -------------------------------------------------------------------------
-    # _first()
+    # set_bit_symbols()
     #
-    # Compute the value of FIRST1(beta) where beta is a tuple of symbols.
+    # Numbers the terminals, '$end' and '<empty>' for the FIRST and FOLLOW
+    # bitsets.  '<empty>' always has the highest bit.
+    # -------------------------------------------------------------------------
+    def set_bit_symbols(self):
+        self.BitSymbols = list(self.Terminals) + ['$end', '<empty>']
+        self.BitIds = {sym: i for i, sym in enumerate(self.BitSymbols)}
+
+    # -------------------------------------------------------------------------
+    # bits_to_symbols()
     #
-    # During execution of compute_first1, the result may be incomplete.
-    # Afterward (e.g., when called from compute_follow()), it will be complete.
+    # The symbols of a FIRST or FOLLOW bitset in bit order
     # -------------------------------------------------------------------------
-    def _first(self, beta):
+    def bits_to_symbols(self, bits):
+        symbols = []
+        while bits:
+            low = bits & -bits
+            symbols.append(self.BitSymbols[low.bit_length() - 1])
+            bits ^= low
+        return symbols
 
-        # We are computing First(x1,x2,x3,...,xn)
-        result = []
+    # -------------------------------------------------------------------------
+    # first_bits()
+    #
+    # FIRST1(beta) as a bitset, where beta is a tuple of symbols.  The
+    # '<empty>' bit is set if every symbol of beta can produce empty.
+    #
+    # During execution of compute_first, the result may be incomplete.
+    # Afterward (e.g., when called from compute_follow()), it will be complete.
+    # -------------------------------------------------------------------------
+    def first_bits(self, beta):
+        FirstBits = self.FirstBits
+        empty = 1 << self.BitIds['<empty>']
+        result = 0
         for x in beta:
-            x_produces_empty = False
+            f = FirstBits[x]
+            result |= f
+            if not f & empty:
+                return result & ~empty
+        return result | empty
 
-            # Add all the non-<empty> symbols of First[x] to the result.
-            for f in self.First[x]:
-                if f == '<empty>':
-                    x_produces_empty = True
-                else:
-                    if f not in result:
-                        result.append(f)
-
-            if x_produces_empty:
-                # We have to consider the next x in beta,
-                # i.e. stay in the loop.
-                pass
-            else:
-                # We don't have to consider any further symbols in beta.
-                break
-        else:
-            # There was no 'break' from the loop,
-            # so x_produces_empty was true for all x in beta,
-            # so beta produces empty as well.
-            result.append('<empty>')
-
-        return result
+    # -------------------------------------------------------------------------
+    # _first()
+    #
+    # Compute the value of FIRST1(beta) where beta is a tuple of symbols.
+    # -------------------------------------------------------------------------
+    def _first(self, beta):
+        return self.bits_to_symbols(self.first_bits(beta))
 
     # -------------------------------------------------------------------------
     # compute_first()
     #
-    # Compute the value of FIRST1(X) for all symbols
+    # Compute the value of FIRST1(X) for all symbols.  A production is
+    # (re)evaluated only when it is new or the FIRST set of a nonterminal it
+    # uses has grown.
     # -------------------------------------------------------------------------
     def compute_first(self):
         if self.First:
             return self.First
 
+        self.set_bit_symbols()
+        FirstBits = self.FirstBits
+
         # Terminals:
         for t in self.Terminals:
-            self.First[t] = [t]
+            FirstBits[t] = 1 << self.BitIds[t]
 
-        self.First['$end'] = ['$end']
+        FirstBits['$end'] = 1 << self.BitIds['$end']
 
         # Nonterminals:
 
         # Initialize to the empty set:
         for n in self.Nonterminals:
-            self.First[n] = []
+            FirstBits[n] = 0
 
         # Then propagate symbols until no change:
-        while True:
-            some_change = False
-            for n in self.Nonterminals:
-                for p in self.Prodnames[n]:
-                    for f in self._first(p.prod):
-                        if f not in self.First[n]:
-                            self.First[n].append(f)
-                            some_change = True
-            if not some_change:
-                break
+        work = self.Productions[:0:-1]
+        queued = set(range(1, len(self.Productions)))
+        while work:
+            p = work.pop()
+            queued.discard(p.number)
+            old = FirstBits[p.name]
+            new = old | self.first_bits(p.prod)
+            if new != old:
+                FirstBits[p.name] = new
+                # Rule 0 (S' -> start) has no FIRST set of its own
+                for number in self.Nonterminals[p.name]:
+                    if number and number not in queued:
+                        queued.add(number)
+                        work.append(self.Productions[number])
+
+        for x, bits in FirstBits.items():
+            self.First[x] = self.bits_to_symbols(bits)
 
         return self.First
 
@@ -1151,6 +1540,10 @@ class Grammar(object):
     # Computes all of the follow sets for every non-terminal symbol.  The
     # follow set is the set of all symbols that might follow a given
     # non-terminal.  See the Dragon book, 2nd Ed. p. 189.
+    #
+    # Each production adds FIRST of what follows a nonterminal to its follow
+    # set once.  Only the follow(a) to follow(b) inclusions are then
+    # propagated, from a nonterminal whose follow set has grown.
     # ---------------------------------------------------------------------
     def compute_follow(self, start=None):
         # If already computed, return the result
@@ -1161,38 +1554,47 @@ class Grammar(object):
         if not self.First:
             self.compute_first()
 
+        FollowBits = self.FollowBits
+        empty = 1 << self.BitIds['<empty>']
+
         # Add '$end' to the follow list of the start symbol
         for k in self.Nonterminals:
-            self.Follow[k] = []
+            FollowBits[k] = 0
 
         if not start:
             start = self.Productions[1].name
 
-        self.Follow[start] = ['$end']
-
-        while True:
-            didadd = False
-            for p in self.Productions[1:]:
-                # Here is the production set
-                for i, B in enumerate(p.prod):
-                    if B in self.Nonterminals:
-                        # Okay. We got a non-terminal in a production
-                        fst = self._first(p.prod[i+1:])
-                        hasempty = False
-                        for f in fst:
-                            if f != '<empty>' and f not in self.Follow[B]:
-                                self.Follow[B].append(f)
-                                didadd = True
-                            if f == '<empty>':
-                                hasempty = True
-                        if hasempty or i == (len(p.prod)-1):
-                            # Add elements of follow(a) to follow(b)
-                            for f in self.Follow[p.name]:
-                                if f not in self.Follow[B]:
-                                    self.Follow[B].append(f)
-                                    didadd = True
-            if not didadd:
-                break
+        FollowBits[start] = 1 << self.BitIds['$end']
+
+        # Nonterminals whose follow set includes the follow set of each nonterminal
+        includes = {k: [] for k in self.Nonterminals}
+
+        for p in self.Productions[1:]:
+            # Here is the production set
+            for i, B in enumerate(p.prod):
+                if B in self.Nonterminals:
+                    # Okay. We got a non-terminal in a production
+                    fst = self.first_bits(p.prod[i+1:])
+                    FollowBits[B] |= fst & ~empty
+                    if fst & empty and B != p.name:
+                        # Add elements of follow(a) to follow(b)
+                        includes[p.name].append(B)
+
+        work = list(self.Nonterminals)
+        queued = set(work)
+        while work:
+            a = work.pop()
+            queued.discard(a)
+            for B in includes[a]:
+                new = FollowBits[B] | FollowBits[a]
+                if new != FollowBits[B]:
+                    FollowBits[B] = new
+                    if B not in queued:
+                        queued.add(B)
+                        work.append(B)
+
+        for k, bits in FollowBits.items():
+            self.Follow[k] = self.bits_to_symbols(bits)
         return self.Follow
 
 
@@ -1269,25 +1671,38 @@ def digraph(X, R, FP):
         N[x] = 0
     stack = []
     F = {}
+    S = {}                   # Members of each F(x) list by list id, with the list
     for x in X:
         if N[x] == 0:
-            traverse(x, N, stack, F, X, R, FP)
+            traverse(x, N, stack, F, S, X, R, FP)
     return F
 
-def traverse(x, N, stack, F, X, R, FP):
+# The F(x) lists are shared between the members of a strongly connected component
+# (and with the FP(x) lists they start from), so their member sets are kept by list
+# id to follow the same sharing.  The list is kept with its set so its id is not
+# reused.
+def traverse(x, N, stack, F, S, X, R, FP):
     stack.append(x)
     d = len(stack)
     N[x] = d
     F[x] = FP(x)             # F(X) <- F'(x)
+    if id(F[x]) not in S:
+        S[id(F[x])] = (F[x], set(F[x]))
 
     rel = R(x)               # Get y's related to x
     for y in rel:
         if N[y] == 0:
-            traverse(y, N, stack, F, X, R, FP)
+            traverse(y, N, stack, F, S, X, R, FP)
         N[x] = min(N[x], N[y])
-        for a in F.get(y, []):
-            if a not in F[x]:
-                F[x].append(a)
+        Fx = F[x]
+        Fy = F.get(y)
+        if Fy is None or Fy is Fx:
+            continue
+        Sx = S[id(Fx)][1]
+        for a in Fy:
+            if a not in Sx:
+                Sx.add(a)
+                Fx.append(a)
     if N[x] == d:
         N[stack[-1]] = MAXINT
         F[stack[-1]] = F[x]
@@ -1323,6 +1738,10 @@ class LRTable:
         self.lr_productions  = grammar.Productions    # Copy of grammar Production array
         self.lr_goto_cache = {}        # Cache of computed gotos
         self.lr0_cidhash   = {}        # Cache of closures
+        self.lr0_trans     = []        # State transitions, state -> {symbol: state}
+        self.lr0_kernels   = {}        # Goto sets by the ids of their kernel items
+        self.lr_dr_cache   = {}        # Terminals shifted in each state, for dr_relation()
+        self.lr_reads_cache = {}       # reads_relation() of each state
 
         self._add_count    = 0         # Internal counter used to detect cycles
 
@@ -1407,7 +1826,12 @@ class LRTable:
         self.lr_goto_cache[(id(I), x)] = g
         return g
 
-    # Compute the LR(0) sets of item function
+    # Compute the LR(0) sets of item function.  The gotos of a state on all
+    # symbols are found in one pass over its items, and a goto set is identified
+    # by the ids of its kernel items in order, which is what lr0_goto() does
+    # through lr_goto_cache.  The goto of every state on every symbol is recorded
+    # in lr0_trans, so later passes look transitions up by state number instead
+    # of recomputing goto sets
     def lr0_items(self):
         C = [self.lr0_closure([self.grammar.Productions[0].lr_next])]
         i = 0
@@ -1415,10 +1839,14 @@ class LRTable:
             self.lr0_cidhash[id(I)] = i
             i += 1
 
+        kernels = self.lr0_kernels
+
         # Loop over the items in C and each grammar symbols
         i = 0
         while i < len(C):
             I = C[i]
+            trans = {}
+            self.lr0_trans.append(trans)
             i += 1
 
             # Collect all of the symbols that could possibly be in the goto(I,X) sets
@@ -1427,15 +1855,34 @@ class LRTable:
                 for s in ii.usyms:
                     asyms[s] = None
 
+            # Kernel of goto(I,X) for each symbol X
+            gs = {}
+            for p in I:
+                n = p.lr_next
+                if n:
+                    if n.lr_before in gs:
+                        gs[n.lr_before].append(n)
+                    else:
+                        gs[n.lr_before] = [n]
+
             for x in asyms:
-                g = self.lr0_goto(I, x)
-                if not g or id(g) in self.lr0_cidhash:
+                if x not in gs:
                     continue
-                self.lr0_cidhash[id(g)] = len(C)
-                C.append(g)
+                key = tuple([id(n) for n in gs[x]])
+                j = kernels.get(key)
+                if j is None:
+                    g = self.lr0_closure(gs[x])
+                    j = kernels[key] = len(C)
+                    self.lr0_cidhash[id(g)] = j
+                    C.append(g)
+                trans[x] = j
 
         return C
 
+    # State reached from state on symbol x, -1 if there is none
+    def lr0_goto_state(self, state, x):
+        return self.lr0_trans[state].get(x, -1)
+
     # -----------------------------------------------------------------------------
     #                       ==== LALR(1) Parsing ====
     #
@@ -1494,15 +1941,14 @@ class LRTable:
     # -----------------------------------------------------------------------------
 
     def find_nonterminal_transitions(self, C):
-        trans = []
+        trans = {}
         for stateno, state in enumerate(C):
             for p in state:
                 if p.lr_index < p.len - 1:
                     t = (stateno, p.prod[p.lr_index+1])
                     if t[1] in self.grammar.Nonterminals:
-                        if t not in trans:
-                            trans.append(t)
-        return trans
+                        trans[t] = None
+        return list(trans)
 
     # -----------------------------------------------------------------------------
     # dr_relation()
@@ -1515,15 +1961,18 @@ class LRTable:
 
     def dr_relation(self, C, trans, nullable):
         state, N = trans
-        terms = []
 
-        g = self.lr0_goto(C[state], N)
-        for p in g:
-            if p.lr_index < p.len - 1:
-                a = p.prod[p.lr_index+1]
-                if a in self.grammar.Terminals:
-                    if a not in terms:
-                        terms.append(a)
+        # The terminals only depend on the goto state, cached in lr_dr_cache
+        j = self.lr0_goto_state(state, N)
+        if j not in self.lr_dr_cache:
+            terms = {}
+            for p in C[j]:
+                if p.lr_index < p.len - 1:
+                    a = p.prod[p.lr_index+1]
+                    if a in self.grammar.Terminals:
+                        terms[a] = None
+            self.lr_dr_cache[j] = list(terms)
+        terms = list(self.lr_dr_cache[j])
 
         # This extra bit is to handle the start state
         if state == 0 and N == self.grammar.Productions[0].prod[0]:
@@ -1538,18 +1987,23 @@ class LRTable:
     # -----------------------------------------------------------------------------
 
     def reads_relation(self, C, trans, empty):
-        # Look for empty transitions
-        rel = []
         state, N = trans
 
-        g = self.lr0_goto(C[state], N)
-        j = self.lr0_cidhash.get(id(g), -1)
+        # The relation only depends on the goto state, cached in lr_reads_cache
+        j = self.lr0_goto_state(state, N)
+        if j in self.lr_reads_cache:
+            return self.lr_reads_cache[j]
+
+        # Look for empty transitions
+        rel = []
+        g = C[j]
         for p in g:
             if p.lr_index < p.len - 1:
                 a = p.prod[p.lr_index + 1]
                 if a in empty:
                     rel.append((j, a))
 
+        self.lr_reads_cache[j] = rel
         return rel
 
     # -----------------------------------------------------------------------------
@@ -1589,13 +2043,24 @@ class LRTable:
         for t in trans:
             dtrans[t] = 1
 
+        lr0_trans = self.lr0_trans
+
+        # Items of each state by production name
+        byname = []
+        for I in C:
+            index = {}
+            for p in I:
+                if p.name in index:
+                    index[p.name].append(p)
+                else:
+                    index[p.name] = [p]
+            byname.append(index)
+
         # Loop over all transitions and compute lookbacks and includes
         for state, N in trans:
             lookb = []
             includes = []
-            for p in C[state]:
-                if p.name != N:
-                    continue
+            for p in byname[state].get(N, ()):
 
                 # Okay, we have a name match.  We now follow the production all the way
                 # through the state machine until we get the . on the right hand side
@@ -1623,13 +2088,10 @@ class LRTable:
                             # Appears to be a relation between (j,t) and (state,N)
                             includes.append((j, t))
 
-                    g = self.lr0_goto(C[j], t)               # Go to next set
-                    j = self.lr0_cidhash.get(id(g), -1)      # Go to next state
+                    j = lr0_trans[j].get(t, -1)              # Go to next state
 
                 # When we get here, j is the final state, now we have to locate the production
-                for r in C[j]:
-                    if r.name != p.name:
-                        continue
+                for r in byname[j].get(p.name, ()):
                     if r.len != p.len:
                         continue
                     i = 0
@@ -1701,15 +2163,19 @@ class LRTable:
     # -----------------------------------------------------------------------------
 
     def add_lookaheads(self, lookbacks, followset):
+        added = {}             # Set of the lookaheads of each (state, item)
         for trans, lb in lookbacks.items():
             # Loop over productions in lookback
             for state, p in lb:
-                if state not in p.lookaheads:
-                    p.lookaheads[state] = []
+                laheads = p.lookaheads.setdefault(state, [])
+                seen = added.get((state, id(p)))
+                if seen is None:
+                    seen = added[state, id(p)] = set(laheads)
                 f = followset.get(trans, [])
                 for a in f:
-                    if a not in p.lookaheads[state]:
-                        p.lookaheads[state].append(a)
+                    if a not in seen:
+                        seen.add(a)
+                        laheads.append(a)
 
     # -----------------------------------------------------------------------------
     # add_lalr_lookaheads()
@@ -1838,8 +2304,7 @@ class LRTable:
                         i = p.lr_index
                         a = p.prod[i+1]       # Get symbol right after the "."
                         if a in self.grammar.Terminals:
-                            g = self.lr0_goto(I, a)
-                            j = self.lr0_cidhash.get(id(g), -1)
+                            j = self.lr0_goto_state(st, a)
                             if j >= 0:
                                 # We are in a shift state
                                 actlist.append((a, p, 'shift and go to state %d' % j))
@@ -1911,8 +2376,7 @@ class LRTable:
                     if s in self.grammar.Nonterminals:
                         nkeys[s] = None
             for n in nkeys:
-                g = self.lr0_goto(I, n)
-                j = self.lr0_cidhash.get(id(g), -1)
+                j = self.lr0_goto_state(st, n)
                 if j >= 0:
                     st_goto[n] = j
                     log.info('    %-30s shift and go to state %d', n, j)
@@ -1922,6 +2386,199 @@ class LRTable:
             goto[st] = st_goto
             st += 1
 
+# -----------------------------------------------------------------------------
+#                          === PARSE TABLE FILES ===
+#
+# The action and goto tables of an LRTable can be saved to a binary parsetab
+# file and read back by later runs, skipping grammar construction and LALR
+# table generation.  File layout:
+#
+#   header: magic, table version, metadata length
+#   metadata: utf-8 json with the signature the tables were built from, the
+#             symbol names and the productions, padded to a multiple of 4 bytes
+#   arrays:   action_offsets, action_syms, action_values,
+#             goto_offsets, goto_syms, goto_values
+#
+# Each table is stored by rows: the entries of state s are
+# syms[offsets[s]:offsets[s+1]] (indexes into the symbol names) and the
+# matching values.  Arrays are native ints, memory mapped and read in place.
+# -----------------------------------------------------------------------------
+
+PARSETAB_MAGIC = b'PLYT'
+PARSETAB_HEADER = struct.Struct('<4sII')
+
+# Stands for the None (error) actions of nonassoc precedence in the arrays
+TAB_NONE = -0x80000000
+
+# Table arrays in file order
+PARSETAB_ARRAYS = ('action_offsets', 'action_syms', 'action_values',
+                   'goto_offsets', 'goto_syms', 'goto_values')
+
+# -----------------------------------------------------------------------------
+# class TableRows:
+#
+# Action or goto table over the parsetab arrays.  Behaves like the
+# state -> {symbol: value} dict of an LRTable, decoding each row the first
+# time it is looked up.
+# -----------------------------------------------------------------------------
+
+class TableRows(dict):
+    def __init__(self, offsets, syms, values, symbols):
+        super().__init__()
+        self.offsets = offsets
+        self.syms    = syms
+        self.values  = values
+        self.symbols = symbols
+        self.nstates = len(offsets) - 1
+
+    def row(self, state):
+        symbols = self.symbols
+        lo, hi = self.offsets[state], self.offsets[state+1]
+        row = {}
+        for s, v in zip(self.syms[lo:hi], self.values[lo:hi]):
+            row[symbols[s]] = None if v == TAB_NONE else v
+        return row
+
+    def __missing__(self, state):
+        if not isinstance(state, int) or not 0 <= state < self.nstates:
+            raise KeyError(state)
+        row = self[state] = self.row(state)
+        return row
+
+    def __len__(self):
+        return self.nstates
+
+    def __iter__(self):
+        return iter(range(self.nstates))
+
+    def __contains__(self, state):
+        return isinstance(state, int) and 0 <= state < self.nstates
+
+    def keys(self):
+        return range(self.nstates)
+
+    def items(self):
+        return [(state, self[state]) for state in range(self.nstates)]
+
+    def values(self):
+        return [self[state] for state in range(self.nstates)]
+
+    # States whose only action is a reduction (see LRParser.set_defaulted_states)
+    def defaulted_states(self):
+        offsets, values = self.offsets, self.values
+        defaulted = {}
+        for state in range(self.nstates):
+            lo = offsets[state]
+            if offsets[state+1] - lo == 1 and values[lo] < 0 and values[lo] != TAB_NONE:
+                defaulted[state] = values[lo]
+        return defaulted
+
+# -----------------------------------------------------------------------------
+# class ParseTable:
+#
+# Parse tables read from a parsetab file.  Has the lr_action, lr_goto and
+# lr_productions attributes LRParser reads from an LRTable.
+# -----------------------------------------------------------------------------
+
+class ParseTable(object):
+    def __init__(self):
+        self.lr_action      = None
+        self.lr_goto        = None
+        self.lr_productions = None
+
+    # Load the tables from filename.  Returns False, leaving the table unchanged,
+    # if the file is missing, unreadable, from another table version or built
+    # from another grammar
+    def read_table(self, filename, signature):
+        try:
+            with open(filename, 'rb') as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        try:
+            magic, version, meta_len = PARSETAB_HEADER.unpack_from(buf, 0)
+            if magic != PARSETAB_MAGIC or version != int(__tabversion__):
+                return False
+            meta = json.loads(bytes(buf[PARSETAB_HEADER.size:PARSETAB_HEADER.size + meta_len]))
+            if meta['signature'] != signature or meta['itemsize'] != array('i').itemsize:
+                return False
+
+            view = memoryview(buf)
+            offset = PARSETAB_HEADER.size + meta_len
+            arrays = {}
+            for name, length in zip(PARSETAB_ARRAYS, meta['arrays']):
+                nbytes = length * meta['itemsize']
+                arrays[name] = view[offset:offset + nbytes].cast('i')
+                offset += nbytes
+            if offset > len(buf):
+                return False
+        except (struct.error, ValueError, KeyError, TypeError):
+            return False
+
+        symbols = meta['symbols']
+        self.lr_action = TableRows(arrays['action_offsets'], arrays['action_syms'], arrays['action_values'], symbols)
+        self.lr_goto = TableRows(arrays['goto_offsets'], arrays['goto_syms'], arrays['goto_values'], symbols)
+        self.lr_productions = [MiniProduction(*p) for p in meta['productions']]
+        return True
+
+    # Bind all production function names to callable objects in pdict
+    def bind_callables(self, pdict):
+        for p in self.lr_productions:
+            p.bind(pdict)
+
+# -----------------------------------------------------------------------------
+# parsetab_signature()
+#
+# Digest of ParserReflect.signature(), which covers the start symbol,
+# precedence, tokens and the docstrings of every grammar rule
+# -----------------------------------------------------------------------------
+def parsetab_signature(pinfo):
+    return hashlib.sha256(pinfo.signature().encode('utf-8')).hexdigest()
+
+# -----------------------------------------------------------------------------
+# write_parsetab()
+#
+# Write the tables of lr (an LRTable) to filename for signature
+# -----------------------------------------------------------------------------
+def write_parsetab(lr, filename, signature):
+    symbols = []
+    symbol_ids = {}
+    arrays = {name: array('i') for name in PARSETAB_ARRAYS}
+
+    for table, prefix in ((lr.lr_action, 'action_'), (lr.lr_goto, 'goto_')):
+        offsets = arrays[prefix + 'offsets']
+        syms = arrays[prefix + 'syms']
+        values = arrays[prefix + 'values']
+        offsets.append(0)
+        for state in range(len(table)):
+            for sym, value in table[state].items():
+                if sym not in symbol_ids:
+                    symbol_ids[sym] = len(symbols)
+                    symbols.append(sym)
+                syms.append(symbol_ids[sym])
+                values.append(TAB_NONE if value is None else value)
+            offsets.append(len(syms))
+
+    meta = {
+        'signature': signature,
+        'symbols': symbols,
+        'productions': [[p.str, p.name, p.len, p.func, p.file, p.line] for p in lr.lr_productions],
+        'itemsize': array('i').itemsize,
+        'arrays': [len(arrays[name]) for name in PARSETAB_ARRAYS],
+    }
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    meta_bytes += b' ' * (-len(meta_bytes) % 4)
+
+    # Write next to the final file and rename so readers never see a partial file
+    tmpfile = f'{filename}.{os.getpid()}.tmp'
+    with open(tmpfile, 'wb') as f:
+        f.write(PARSETAB_HEADER.pack(PARSETAB_MAGIC, int(__tabversion__), len(meta_bytes)))
+        f.write(meta_bytes)
+        for name in PARSETAB_ARRAYS:
+            f.write(arrays[name].tobytes())
+    os.replace(tmpfile, filename)
+
 # -----------------------------------------------------------------------------
 #                            === INTROSPECTION ===
 #
@@ -2266,11 +2923,16 @@ class ParserReflect(object):
 # yacc(module)
 #
 # Build a parser
+#
+# If parsetab is a file path the parse tables are read from it when it was
+# written for the same grammar (see parsetab_signature), skipping grammar
+# validation and table generation.  Otherwise the tables are generated as
+# usual and written to parsetab for the next run.
 # -----------------------------------------------------------------------------
 
 def yacc(*, debug=yaccdebug, module=None, start=None,
          check_recursion=True, optimize=False, debugfile=debug_file,
-         debuglog=None, errorlog=None):
+         debuglog=None, errorlog=None, parsetab=None):
 
     # Reference to the parsing method of the last built parser
     global parse
@@ -2303,6 +2965,22 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
     if pinfo.error:
         raise YaccError('Unable to build parser')
 
+    # If parsetab is a file path written for the same grammar, read the tables
+    # from it instead of validating the grammar and generating them
+    if parsetab:
+        signature = parsetab_signature(pinfo)
+        lr = ParseTable()
+        if lr.read_table(parsetab, signature):
+            try:
+                lr.bind_callables(pinfo.pdict)
+            except KeyError:
+                # A rule function was renamed.  Build the tables again
+                pass
+            else:
+                parser = LRParser(lr, pinfo.error_func)
+                parse = parser.parse
+                return parser
+
     if debuglog is None:
         if debug:
             try:
@@ -2474,6 +3152,12 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
                 errorlog.warning('Rule (%s) is never reduced', rejected)
                 warned_never.append(rejected)
 
+    if parsetab:
+        try:
+            write_parsetab(lr, parsetab, signature)
+        except OSError as e:
+            errorlog.warning("Couldn't write parsetab %r. %s", parsetab, e)
+
     # Build the parser
     lr.bind_callables(pinfo.pdict)
     parser = LRParser(lr, pinfo.error_func)
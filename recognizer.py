@@ -0,0 +1,178 @@
+# token at a time earley recognizer over a compiled gfg
+# only the state needed for future tokens is kept: the current sigma set (with its scan items
+# bucketed by terminal) and the sigma_end_to_call maps of positions that a live tag can still
+# return to, so memory is bounded by the live tag window rather than the input length
+#
+# positions are reference counted, position k is referenced once by every item with tag k in the
+# current sigma set and once by every call item with tag k waiting in the sigma_end_to_call map of
+# another live position (completing that call brings tag k back). when the count drops to zero
+# the map for k is released, which in turn drops the references it held
+#
+# with gfg.leo on, completions of deterministic right recursive chains go straight to the top of
+# the chain (see GFG.leo_top), so the sigma set of a right recursive list stays the same size.
+# the leo_top memo of a position is kept and released together with its sigma_end_to_call map.
+# once the top of <end label, k> is memoized the single call item that completes it is not read
+# again, so it is dropped and the memo references the tag of the top instead. the positions the
+# chain went through are then only held by each other and are released, which keeps the state
+# of a right recursive list the same size as well
+#
+# the closure of a position is run when the token after it is fed (or at the end of the input),
+# so the prediction filter sees that token
+class Recognizer:
+    def __init__(self, gfg):
+        self.gfg = gfg
+        self.compiled = gfg.compiled
+
+        self.position = 0
+        # set once a token could not be scanned or finish() was called
+        self.failed = False
+        self.finished = False
+
+        # zeroth sigma set initially contains <•S, 0>
+        self.sigma_set = {(0, 0)}
+        self.scan_set = {}
+        # position -> {end label: call items}, only for positions referenced by live tags
+        self.sigma_end_to_call = {0: {}}
+        # position -> {end label: top of its chain}, the leo_top memo of the same positions
+        self.sigma_leo_tops = {0: {}}
+        # position -> number of references to it, <•S, 0> holds the first one
+        self.ref_counts = {0: 1}
+        # whether closure has run on the current sigma set
+        self.closed = False
+
+    # runs the gfg closure on the current sigma set and takes the references it holds, lookahead
+    # is the lookahead_bit of the next token (None predicts everything). does nothing if the
+    # current sigma set is already closed
+    def closure(self, lookahead=None):
+        if self.closed:
+            return
+        self.closed = True
+        pos = self.position
+        # references held by the scanned items, taken over by the closed set below
+        scanned_tags = [tag for _, tag in self.sigma_set]
+        # exit and return maps are only needed to build parse trees
+        self.gfg.eclosuer({pos: self.sigma_set}, {pos: set()}, {pos: self.scan_set}, self.sigma_end_to_call, {pos: {}}, {pos: {}}, sigma_num=pos,
+                          lookahead=lookahead, sigma_leo_tops=self.sigma_leo_tops if self.gfg.leo else None)
+
+        ref_counts = self.ref_counts
+        for _, tag in self.sigma_set:
+            ref_counts[tag] = ref_counts.get(tag, 0) + 1
+        # calls made at pos with tag pos are only reachable through pos itself
+        for callers in self.sigma_end_to_call[pos].values():
+            for _, call_tag in callers:
+                if call_tag != pos:
+                    ref_counts[call_tag] = ref_counts.get(call_tag, 0) + 1
+        if self.gfg.leo:
+            self.drop_chain_calls({tag for _, tag in self.sigma_set if tag != pos})
+        self.drop_references(scanned_tags)
+
+        if pos not in ref_counts:
+            self.release_position(pos)
+
+    # drops one reference to each tag in tags, releasing positions that are no longer referenced
+    def drop_references(self, tags):
+        ref_counts = self.ref_counts
+        stack = list(tags)
+        while stack:
+            tag = stack.pop()
+            ref_counts[tag] -= 1
+            if ref_counts[tag] == 0:
+                del ref_counts[tag]
+                stack.extend(self.release_position(tag))
+
+    # drops the call items of the positions in tags whose leo_top is memoized, the memo references
+    # the tag of the top instead (see the top of the file)
+    def drop_chain_calls(self, tags):
+        ref_counts = self.ref_counts
+        dropped = []
+        for tag in tags:
+            end_to_call = self.sigma_end_to_call[tag]
+            for end_label, top in self.sigma_leo_tops[tag].items():
+                if top is None or end_label not in end_to_call:
+                    continue
+                # a chain link has a single caller
+                (_, call_tag), = end_to_call.pop(end_label)
+                if top[1] != tag:
+                    ref_counts[top[1]] = ref_counts.get(top[1], 0) + 1
+                if call_tag != tag:
+                    dropped.append(call_tag)
+        self.drop_references(dropped)
+
+    # releases the sigma_end_to_call map and leo_top memo for pos, returns the tags it referenced
+    def release_position(self, pos):
+        tops = self.sigma_leo_tops.pop(pos, {})
+        end_to_call = self.sigma_end_to_call.pop(pos, {})
+        tags = [call_tag for callers in end_to_call.values() for _, call_tag in callers if call_tag != pos]
+        # memoized tops whose call item was dropped
+        tags.extend(top[1] for end_label, top in tops.items()
+                    if top is not None and end_label not in end_to_call and top[1] != pos)
+        return tags
+
+    # advances the recognizer by one token, token may be a terminal name or a lexer token
+    # returns False once the input seen so far is not a prefix of any string in the language
+    def feed(self, token):
+        return self.feed_term(self.compiled.terminal_id(getattr(token, "type", token)))
+
+    # feed for a token given by its terminal id
+    def feed_term(self, term):
+        if self.failed or self.finished:
+            return False
+
+        scan_target = self.compiled.scan_target
+        self.closure(self.gfg.lookahead_bit(term))
+
+        # scan inference rule, only the items waiting on this terminal advance
+        next_set = set()
+        for label, tag in self.scan_set.get(term, ()):
+            next_set.add((scan_target[label], tag))
+
+        prev_set = self.sigma_set
+        self.position += 1
+        self.sigma_set = next_set
+        self.scan_set = {}
+
+        if not next_set:
+            # nothing can advance so no continuation of the input is accepted
+            self.failed = True
+            self.sigma_end_to_call = {}
+            self.sigma_leo_tops = {}
+            self.ref_counts = {}
+            return False
+
+        self.sigma_end_to_call[self.position] = {}
+        self.sigma_leo_tops[self.position] = {}
+        self.closed = False
+        ref_counts = self.ref_counts
+        for _, tag in next_set:
+            ref_counts[tag] = ref_counts.get(tag, 0) + 1
+        # the previous sigma set is no longer needed once the new one holds its references
+        self.drop_references([tag for _, tag in prev_set])
+        return True
+
+    # returns whether the tokens fed so far are a string in the language
+    def is_accepting(self):
+        # the next token is not known yet, so nothing is filtered
+        self.closure()
+        # <S•, 0> in the current sigma set
+        return (1, 0) in self.sigma_set
+
+    # returns the terminals that the next token can be without failing
+    def expected_terminals(self):
+        self.closure()
+        terminals = self.compiled.terminals
+        return [terminals[term] for term in sorted(self.scan_set)]
+
+    # ends the input, returns whether it was accepted and releases all state
+    def finish(self):
+        accepted = False
+        if not self.failed and not self.finished:
+            self.closure(self.gfg.lookahead_bit(None))
+            accepted = (1, 0) in self.sigma_set
+        self.finished = True
+        self.closed = True
+        self.sigma_set = set()
+        self.scan_set = {}
+        self.sigma_end_to_call = {}
+        self.sigma_leo_tops = {}
+        self.ref_counts = {}
+        return accepted
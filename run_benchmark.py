@@ -81,7 +81,7 @@ def old_get_b_grammar_parsers():
              ]
     }
 
-    gfg = GFG(ABLexer(), use_pydot=False)
+    gfg = GFG(ABLexer())
     gfg.build_gfg(grammar, "S")
 
     res.append((gfg.parse_top_down, "gfg_top_down_sppf"))
@@ -109,8 +109,11 @@ def get_b_grammar_parsers():
     res = []
 
     res.append((['python3', './parse_programs/gfg_parse.py', '--topdown', '--input', ''], "gfg_top_down_sppf"))
+    res.append((['python3', './parse_programs/gfg_parse.py', '--topdown', '--worklist', 'queue', '--input', ''], "gfg_top_down_sppf_queue"))
     res.append((['python3', './parse_programs/gfg_parse.py', '--bottomup', '--input', ''], "gfg_bottom_up_sppf"))
     res.append((['python3', './parse_programs/gfg_parse.py', '--single', '--input', ''], "gfg_single_tree"))
+    res.append((['python3', './parse_programs/gfg_parse.py', '--recognize', '--input', ''], "gfg_recognize"))
+    res.append((['python3', './parse_programs/gfg_parse.py', '--recognize', '--release-dead-sets', '--input', ''], "gfg_recognize_released"))
     res.append((['python3', './parse_programs/lark_parse.py', '--earley', '--input', ''], "lark_earley_sppf"))
     res.append((['python3', './parse_programs/lark_parse.py', '--cyk', '--input', ''], "lark_cyk_single"))
     res.append((['python3', './parse_programs/spark_parse.py', '--input', ''], "spark_earley_single"))
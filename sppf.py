@@ -1,4 +1,4 @@
-import pydot
+from array import array
 
 # class SppfNode:
 #     def __init__(self, node_def, long_name, type, use_pydot):
@@ -30,32 +30,46 @@ import pydot
 #         return isinstance(other, SppfNode) and self.label == other.label and self.start == other.start and self.end == other.end
 
 
+# builds a pydot graph of a forest for visualization/debugging only, node_defs are (label, start, end)
+# triples or negative ints for packed nodes. gfg is used to name nodes whose label is a gfg node
+def forest_to_dot(node_defs, children, gfg=None):
+    import pydot
+
+    if gfg is not None:
+        gfg.require_nodes()
+    graph = pydot.Dot("sppf_graph", graph_type="digraph", bgcolor="yellow")
+    dot_names = {}
+
+    def dot_name(node_def):
+        if node_def not in dot_names:
+            dot_names[node_def] = str(len(dot_names))
+            if isinstance(node_def, int):
+                graph.add_node(pydot.Node(dot_names[node_def], label="", shape="circle"))
+            else:
+                label, start, end = node_def
+                long_name = gfg.nodes[label].long_name if gfg is not None and isinstance(label, int) else label
+                graph.add_node(pydot.Node(dot_names[node_def], label=f"{long_name}, {start}, {end}", shape="circle"))
+        return dot_names[node_def]
+
+    for node_def in node_defs:
+        src_name = dot_name(node_def)
+        for child in children(node_def):
+            graph.add_edge(pydot.Edge(src_name, dot_name(child)))
+    return graph
+
+
 class Sppf:
 
-    def __init__(self, use_pydot=True):
+    def __init__(self):
         self.nodes = set()
         self.edges = {} # maps source to dest
-        self.use_pydot = use_pydot
         self.packed_id = -1
-        if self.use_pydot:
-            self.graph = pydot.Dot("sppf_graph", graph_type="digraph", bgcolor="yellow")
-            self.map_node_to_label = {}
 
-    def add_node(self, node_def, long_name, type):
+    # type is one of symbol, intermediate or packed, node_def is all that is stored
+    def add_node(self, node_def, type):
         if node_def not in self.nodes:
             # node = SppfNode(node_def, long_name, type, self.use_pydot)
             self.nodes.add(node_def)
-            if self.use_pydot:
-                if type == "packed":
-                    self.map_node_to_label[node_def] = node_def
-
-                    self.graph.add_node(pydot.Node(node_def, label="", shape="circle"))
-                else :
-                    label = f"{long_name}, {node_def[1]}, {node_def[2]}"
-                    self.map_node_to_label[node_def] = label
-                    
-                    self.graph.add_node(pydot.Node(label, shape="circle"))
-                    
         else:
             pass
             # print(f"Node: {node_def} already exists in graph")
@@ -81,23 +95,162 @@ class Sppf:
 
         # src_node.outgoing_edges[dest] = ""
         # dest_node.incoming_edges[src] = ""
-
-        # optional edges in pydot for gfs visualization, scan edges are black, 
-        # epsilon edges are red
-        if self.use_pydot:
-            self.graph.add_edge(pydot.Edge(self.map_node_to_label[src], self.map_node_to_label[dest]))
         # print(f"\t\t\tcreating edge from {src.long_name} to {dest.long_name} with LABEL: {label}")
 
     def add_family(self, parent, child1, child2):
         packed_node_def = self.packed_id
         self.packed_id -= 1
 
-        self.add_node(packed_node_def, "", "packed")
+        self.add_node(packed_node_def, "packed")
 
         self.add_edge(parent, packed_node_def)
         self.add_edge(packed_node_def, child1)
         self.add_edge(packed_node_def, child2)
 
+    def children(self, node_def):
+        return self.edges.get(node_def, ())
+
+    # removes the children of node_def and the packed nodes under it, returns the children it had
+    # with each packed node replaced by its two children
+    def clear_children(self, node_def):
+        children = []
+        for child in self.edges.pop(node_def, ()):
+            if isinstance(child, int):
+                self.nodes.discard(child)
+                children.extend(self.edges.pop(child, ()))
+            else:
+                children.append(child)
+        return children
+
+    # removes a node that has no children left
+    def remove_node(self, node_def):
+        self.nodes.discard(node_def)
+
+    def to_dot(self, gfg=None):
+        return forest_to_dot(self.nodes, self.children, gfg)
+
+    # must have graphvis installed for this to work
+    def write_png(self, path, gfg=None):
+        self.to_dot(gfg).write_png(path)
+
+
+# same api as Sppf but node triples are interned to dense integer ids and edges are kept in append
+# only integer arrays, the children of a node form a linked list through edge_next starting at
+# first_edge[node id]. packed nodes are still named by negative ints outside the class but are not
+# put in the nodes map
+class CompactSppf:
+
+    def __init__(self):
+        # maps a (label, start, end) node triple to its id
+        self.nodes = {}
+        # id -> node triple or packed node int
+        self.node_defs = []
+        # packed node -k has id packed_ids[k - 1]
+        self.packed_ids = array('i')
+        self.packed_id = -1
+
+        # most recently added edge out of each node, -1 if it has no children
+        self.first_edge = array('i')
+        # child id of each edge and the edge added before it from the same parent
+        self.edge_child = array('i')
+        self.edge_next = array('i')
+        # (src id, dest id) of the edges added by add_edge packed into one int, so a duplicate is
+        # found without walking the children of src. add_family edges are always new
+        self.edge_keys = set()
+
+    def node_id(self, node_def):
+        if isinstance(node_def, int):
+            return self.packed_ids[-node_def - 1]
+        return self.nodes[node_def]
+
+    def new_node(self, node_def):
+        node_id = len(self.node_defs)
+        self.node_defs.append(node_def)
+        self.first_edge.append(-1)
+        return node_id
+
+    def add_node(self, node_def, type):
+        if node_def not in self.nodes:
+            self.nodes[node_def] = self.new_node(node_def)
+
+    def append_edge(self, src_id, dest_id):
+        self.edge_child.append(dest_id)
+        self.edge_next.append(self.first_edge[src_id])
+        self.first_edge[src_id] = len(self.edge_child) - 1
+
+    def child_ids(self, node_id):
+        edge = self.first_edge[node_id]
+        while edge != -1:
+            yield self.edge_child[edge]
+            edge = self.edge_next[edge]
+
+    def add_edge(self, src, dest):
+        src_id = self.node_id(src)
+        dest_id = self.node_id(dest)
+
+        key = src_id << 32 | dest_id
+        if key in self.edge_keys:
+            return
+        self.edge_keys.add(key)
+
+        self.append_edge(src_id, dest_id)
+
+    def add_family(self, parent, child1, child2):
+        packed_node_def = self.packed_id
+        self.packed_id -= 1
+
+        node_id = self.node_id
+        first_edge = self.first_edge
+        edge_child = self.edge_child
+        edge_next = self.edge_next
+
+        packed_id = len(self.node_defs)
+        self.node_defs.append(packed_node_def)
+        self.packed_ids.append(packed_id)
+
+        # the packed node is new so none of these edges can already exist, they are appended
+        # inline as ambiguous forests add a family per derivation
+        parent_id = node_id(parent)
+        edge = len(edge_child)
+        edge_child.append(packed_id)
+        edge_next.append(first_edge[parent_id])
+        first_edge[parent_id] = edge
+        edge_child.append(node_id(child1))
+        edge_next.append(-1)
+        edge_child.append(node_id(child2))
+        edge_next.append(edge + 1)
+        first_edge.append(edge + 2)
+
+    def children(self, node_def):
+        return [self.node_defs[child_id] for child_id in self.child_ids(self.node_id(node_def))]
+
+    # unlinks the children of node_def, returns the children it had with each packed node replaced
+    # by its two children. the unlinked edges and packed nodes stay in the arrays
+    def clear_children(self, node_def):
+        node_id = self.node_id(node_def)
+        node_defs = self.node_defs
+        children = []
+        for child_id in self.child_ids(node_id):
+            child = node_defs[child_id]
+            if isinstance(child, int):
+                children.extend(node_defs[member_id] for member_id in self.child_ids(child_id))
+            else:
+                self.edge_keys.discard(node_id << 32 | child_id)
+                children.append(child)
+        self.first_edge[node_id] = -1
+        return children
+
+    # forgets a node that has no children left, its id is not reused
+    def remove_node(self, node_def):
+        del self.nodes[node_def]
+
+    def to_dot(self, gfg=None):
+        return forest_to_dot(self.node_defs, self.children, gfg)
+
+    # must have graphvis installed for this to work
+    def write_png(self, path, gfg=None):
+        self.to_dot(gfg).write_png(path)
+
 
 
 
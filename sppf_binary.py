@@ -0,0 +1,163 @@
+import json
+import mmap
+import struct
+from array import array
+
+from sppf import Sppf, CompactSppf, forest_to_dot
+from old_sppf import Sppf_Old
+
+# binary form of a shared packed parse forest, for handing forests between processes without
+# pickling nested sets. a forest is a list of nodes with dense ids and fixed width int arrays:
+#
+#   header: magic, format version, int size, symbol table length, number of nodes, number of
+#           edges
+#   symbol table: utf-8 json list of the node labels (gfg node labels and terminal names),
+#                 padded to a multiple of the int size
+#   node_symbol[num_nodes]: index into the symbol table, -1 for packed nodes
+#   node_start[num_nodes], node_end[num_nodes]: input span of the node
+#   child_offsets[num_nodes + 1], child_ids[num_edges]: children of node n are
+#                 child_ids[child_offsets[n]:child_offsets[n + 1]]
+#
+# the arrays are native ints, the header records their size so a reader with other ints refuses
+# the file. SppfView reads them in place, so loading a forest only parses the symbol table
+
+SPPF_MAGIC = b"SPPF"
+SPPF_VERSION = 2
+HEADER = struct.Struct("<4sIIIII")
+
+# node list, children function and packed node test for each forest class
+def forest_parts(sppf):
+    if isinstance(sppf, CompactSppf):
+        return sppf.node_defs, sppf.children, lambda node_def: isinstance(node_def, int)
+    if isinstance(sppf, Sppf):
+        return list(sppf.nodes), sppf.children, lambda node_def: isinstance(node_def, int)
+    if isinstance(sppf, Sppf_Old):
+        return (list(sppf.nodes), lambda node_def: sppf.nodes[node_def].outgoing_edges,
+                lambda node_def: sppf.nodes[node_def].type == "packed")
+    raise TypeError(f"cannot serialize {type(sppf).__name__}")
+
+def sppf_bytes(sppf):
+    node_defs, children, is_packed = forest_parts(sppf)
+
+    # node ids follow node_defs, children missing from it are appended as they are found
+    ids = {node_def: node_id for node_id, node_def in enumerate(node_defs)}
+    node_defs = list(node_defs)
+
+    def node_id(node_def):
+        if node_def not in ids:
+            ids[node_def] = len(node_defs)
+            node_defs.append(node_def)
+        return ids[node_def]
+
+    symbols = []
+    symbol_ids = {}
+    node_symbol = array('i')
+    node_start = array('i')
+    node_end = array('i')
+    child_offsets = array('i', [0])
+    child_ids = array('i')
+
+    # node_defs grows while it is walked
+    n = 0
+    while n < len(node_defs):
+        node_def = node_defs[n]
+        n += 1
+        if is_packed(node_def):
+            node_symbol.append(-1)
+            node_start.append(-1)
+            node_end.append(-1)
+        else:
+            label, start, end = node_def
+            # labels are gfg node labels or terminal names, the old sppf also uses Node objects
+            symbol = label if isinstance(label, (int, str)) else str(label)
+            if symbol not in symbol_ids:
+                symbol_ids[symbol] = len(symbols)
+                symbols.append(symbol)
+            node_symbol.append(symbol_ids[symbol])
+            node_start.append(start)
+            node_end.append(end)
+
+        for child in children(node_def):
+            child_ids.append(node_id(child))
+        child_offsets.append(len(child_ids))
+
+    symbol_bytes = json.dumps(symbols).encode("utf-8")
+    itemsize = array('i').itemsize
+    symbol_bytes += b" " * (-len(symbol_bytes) % itemsize)
+
+    parts = [HEADER.pack(SPPF_MAGIC, SPPF_VERSION, itemsize, len(symbol_bytes), len(node_defs), len(child_ids)), symbol_bytes]
+    for arr in (node_symbol, node_start, node_end, child_offsets, child_ids):
+        parts.append(arr.tobytes())
+    return b"".join(parts)
+
+def write_sppf(path, sppf):
+    with open(path, "wb") as f:
+        f.write(sppf_bytes(sppf))
+
+# read only forest over a buffer written by sppf_bytes (bytes, mmap or any buffer). node ids are
+# the dense ids of the file, node defs are (label, start, end) triples like Sppf with packed node
+# n named -(n + 1)
+class SppfView:
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        magic, version, itemsize, symbols_len, num_nodes, num_edges = HEADER.unpack_from(view, 0)
+        if magic != SPPF_MAGIC or version != SPPF_VERSION:
+            raise ValueError("not a binary sppf or an unsupported version")
+        if itemsize != array('i').itemsize:
+            raise ValueError(f"binary sppf has {itemsize} byte ints, this platform has {array('i').itemsize}")
+
+        offset = HEADER.size
+        self.symbols = json.loads(bytes(view[offset:offset + symbols_len]))
+        offset += symbols_len
+
+        self.num_nodes = num_nodes
+        arrays = []
+        for length in (num_nodes, num_nodes, num_nodes, num_nodes + 1, num_edges):
+            arrays.append(view[offset:offset + itemsize * length].cast("i"))
+            offset += itemsize * length
+        self.node_symbol, self.node_start, self.node_end, self.child_offsets, self.child_ids = arrays
+
+        # node def -> id, only built if a caller looks nodes up by def
+        self.ids = None
+
+    def __len__(self):
+        return self.num_nodes
+
+    def is_packed(self, node_id):
+        return self.node_symbol[node_id] == -1
+
+    def node_def(self, node_id):
+        symbol = self.node_symbol[node_id]
+        if symbol == -1:
+            return -node_id - 1
+        return (self.symbols[symbol], self.node_start[node_id], self.node_end[node_id])
+
+    def node_id(self, node_def):
+        if isinstance(node_def, int):
+            return -node_def - 1
+        if self.ids is None:
+            self.ids = {self.node_def(node_id): node_id for node_id in range(self.num_nodes)}
+        return self.ids[node_def]
+
+    def child_ids_of(self, node_id):
+        return self.child_ids[self.child_offsets[node_id]:self.child_offsets[node_id + 1]]
+
+    def node_defs(self):
+        for node_id in range(self.num_nodes):
+            yield self.node_def(node_id)
+
+    def children(self, node_def):
+        return [self.node_def(child_id) for child_id in self.child_ids_of(self.node_id(node_def))]
+
+    def to_dot(self, gfg=None):
+        return forest_to_dot(self.node_defs(), self.children, gfg)
+
+    # must have graphvis installed for this to work
+    def write_png(self, path, gfg=None):
+        self.to_dot(gfg).write_png(path)
+
+# memory maps a file written by write_sppf
+def read_sppf(path):
+    with open(path, "rb") as f:
+        return SppfView(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
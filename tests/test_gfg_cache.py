@@ -0,0 +1,30 @@
+import os
+import sys
+
+# the modules live in the repository root, next to this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ab_lexer import ABLexer
+from gfg_cache import cached_gfg, load_gfg
+
+grammar = {
+    "S": [["L"]],
+    "L": [["b"],
+          ["b", "L"]
+         ]
+}
+
+
+def test_damaged_cache_file_is_rebuilt(tmp_path):
+    cache_dir = str(tmp_path)
+    cached_gfg(ABLexer(), grammar, cache_dir=cache_dir)
+    path, = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    with open(path, "rb") as f:
+        data = f.read()
+    assert load_gfg(path, ABLexer()).parse_top_down("bbb")
+
+    for length in [10, len(data) // 2, len(data) - 3]:
+        with open(path, "wb") as f:
+            f.write(data[:length])
+        assert load_gfg(path, ABLexer()) is None
+        assert cached_gfg(ABLexer(), grammar, cache_dir=cache_dir).parse_top_down("bbb")
@@ -0,0 +1,70 @@
+import os
+import sys
+
+# the modules live in the repository root, next to this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ab_lexer import ABLexer
+from gfg import GFG
+from incremental import IncrementalParser
+
+right_recursive_grammar = {
+    "S": [["L"]],
+    "L": [["St", "L"],
+          ["St"]
+         ],
+    "St": [["a", "b"],
+           ["a", "St", "b"]
+          ]
+}
+
+
+# the families of every node reachable from root, with the spans read as token positions
+def forest(sppf, root, indexes=None):
+    def node(node_def):
+        if indexes is None or node_def[0] == "ϵ":
+            return node_def
+        label, start, end = node_def
+        return label, indexes[start], indexes[end]
+
+    families = set()
+    seen = {root}
+    stack = [root]
+    while stack:
+        node_def = stack.pop()
+        for child in sppf.children(node_def):
+            members = sppf.children(child) if isinstance(child, int) else [child]
+            # the two children of a packed node do not come in a set order
+            families.add((node(node_def), tuple(sorted(map(repr, map(node, members))))))
+            for member in members:
+                if member not in seen:
+                    seen.add(member)
+                    stack.append(member)
+    return families, len(seen)
+
+
+def check_edits(compact_sppf):
+    gfg = GFG(ABLexer())
+    gfg.build_gfg(right_recursive_grammar, "S")
+    parser = IncrementalParser(gfg, compact_sppf)
+    data = "ab" * 500
+    assert parser.parse(data)
+
+    for offset, deleted, inserted in [(500, 0, "ab"), (300, 0, "aabb"), (100, 2, ""), (701, 0, "ab")]:
+        sppf = parser.edit(offset, deleted, list(inserted))
+        data = data[:offset] + inserted + data[offset + deleted:]
+        # the positions after the edit are kept
+        assert parser.recomputed <= len(inserted) + 2
+
+        families, count = forest(sppf, parser.root, parser.position_indexes())
+        assert (families, count) == forest(gfg.parse_top_down(data), (1, 0, len(data)))
+        # the nodes that are no longer reached are removed
+        assert len([node_def for node_def in sppf.nodes if not isinstance(node_def, int)]) == count
+
+
+def test_right_recursive_edits():
+    check_edits(False)
+
+
+def test_right_recursive_edits_compact_sppf():
+    check_edits(True)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# the modules live in the repository root, next to this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ab_lexer import ABLexer
+from gfg import GFG
+
+b_grammar = {
+    "S": [["L"]],
+    "L": [["b"],
+          ["L", "L"]
+         ]
+}
+
+
+def build_gfg():
+    gfg = GFG(ABLexer())
+    gfg.build_gfg(b_grammar, "S")
+    return gfg
+
+
+# the first token already cannot be scanned, so the recognizer must stop without lexing the rest
+def test_early_rejection_does_not_lex_whole_input():
+    gfg = build_gfg()
+    data = "a" + "b" * 100000
+
+    assert not gfg.recognize_string(data, release_dead_sets=True)
+    assert gfg.lexer.lexer.lexpos < 10
+
+
+def test_pretokenized_input_matches_lexed_input():
+    gfg = build_gfg()
+    data = "b b\tb\nb"
+    term_ids = gfg.lexer.tokenize_to_array(data)
+
+    assert term_ids.typecode == 'i'
+    assert list(term_ids) == list(gfg.input_term_ids(data))
+    assert gfg.recognize_string(term_ids)
@@ -0,0 +1,42 @@
+import os
+import sys
+
+# the modules live in the repository root, next to this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ab_lexer import ABLexer
+from gfg import GFG
+
+right_recursive_grammar = {
+    "S": [["L"]],
+    "L": [["b"],
+          ["b", "L"]
+         ]
+}
+
+
+# sizes of the closed sigma set and of the sigma_end_to_call maps of the streaming recognizer
+# after each of n b tokens
+def state_sizes(leo, n):
+    gfg = GFG(ABLexer(), leo=leo)
+    gfg.build_gfg(right_recursive_grammar, "S")
+    recognizer = gfg.recognizer()
+
+    sizes = []
+    for _ in range(n):
+        assert recognizer.feed("b")
+        assert recognizer.is_accepting()
+        sizes.append((len(recognizer.sigma_set), len(recognizer.sigma_end_to_call)))
+    assert recognizer.finish()
+    return sizes
+
+
+def test_right_recursion_state_size_is_constant():
+    sizes = state_sizes(True, 200)
+    assert max(sizes[5:]) == min(sizes[5:])
+
+
+def test_right_recursion_state_grows_without_leo():
+    sizes = state_sizes(False, 200)
+    assert sizes[-1][0] > sizes[5][0] + 100
+    assert sizes[-1][1] > sizes[5][1] + 100